@@ -0,0 +1,288 @@
+"""
+Binary storage for Aldo - fixed-width entry records read through mmap
+"""
+
+import io
+import copy
+import mmap
+import struct
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from heapq import merge
+from operator import attrgetter
+
+from aldo.fileio import write_atomic
+from aldo.rollups import HourRollups
+from aldo.storage import WorkHoursStorage, WorkEntry, date_ordinal, read_json_file
+
+# File header: magic, format version, reserved, number of records
+HEADER = struct.Struct('<4sHHI')
+MAGIC = b'ALDB'
+VERSION = 1
+
+# Entry record: date ordinal, hours, offset of the entry's text in the blob,
+# byte length of the description and of the timestamp that follow it
+RECORD = struct.Struct('<idIII')
+
+class _MappedEntries:
+    """
+    The records of a mapped entry file
+
+    Indexing yields the record ordinals, so the records can be searched with
+    bisect. Queries hold on to the instance they started with, so a save
+    mapping a new file doesn't pull it from under them.
+    """
+
+    def __init__(self, buffer, count):
+        self.buffer = buffer
+        self.count = count
+        self.blob_start = HEADER.size + count * RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        return struct.unpack_from('<i', self.buffer, HEADER.size + position * RECORD.size)[0]
+
+    def record(self, position):
+        """Decode the entry record at a position"""
+        ordinal, hours, offset, description_length, timestamp_length = RECORD.unpack_from(
+            self.buffer, HEADER.size + position * RECORD.size
+        )
+        start = self.blob_start + offset
+        middle = start + description_length
+        description = self.buffer[start:middle].decode('utf-8')
+        timestamp = self.buffer[middle:middle + timestamp_length].decode('utf-8')
+        return WorkEntry(ordinal, hours, description, timestamp)
+
+# Entries of a storage before its file is mapped
+_NO_ENTRIES = _MappedEntries(b'', 0)
+
+class BinaryWorkHoursStorage(WorkHoursStorage):
+    """
+    Stores work entries as fixed-width records in a memory-mapped file
+
+    aldo_data.bin starts with a header and the entry records sorted by date,
+    followed by a blob holding the descriptions and timestamps. The file is
+    mapped with mmap on load, so opening it costs the same for any history
+    size; queries binary-search the records by date ordinal and decode only
+    the entries they return. The invoice state and the hour rollups are kept
+    in aldo_data.meta.json.
+
+    Entries logged since the last save are kept in memory and merged into a
+    new file by save_data(), which replaces the old one in a single rename.
+    """
+
+    data_filename = 'aldo_data.bin'
+    meta_filename = 'aldo_data.meta.json'
+
+    # Queries only decode the records they need, there's nothing to archive
+    supports_archive = False
+
+    def __init__(self, data_dir=None, settings=None):
+        """Initialize the storage and map the entry file"""
+        self._map = None
+        self._stored = _NO_ENTRIES
+        # Entries logged since the last save, by day ordinal
+        self._pending = {}
+        super().__init__(data_dir=data_dir, settings=settings)
+
+    @property
+    def meta_file(self):
+        """Path of the file holding the invoice state and rollups"""
+        return self.data_dir / self.meta_filename
+
+    def _watched_files(self):
+        """Watch the entry file and the meta file"""
+        return [self.data_file, self.meta_file]
+
+    @staticmethod
+    def _empty_data():
+        """Get the default invoice state for an empty storage"""
+        return {
+            'last_confirmed_invoice': None,
+            'last_unconfirmed_invoice': None,
+            'confirmed_invoices': {}
+        }
+
+    def ensure_storage_exists(self):
+        """Ensure storage directory, entry file and meta file exist"""
+        if not self.data_dir.exists():
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+
+        if not self.data_file.exists():
+            try:
+                self._write_entries([])
+                self._write_json(self.meta_file, self.aldo_data)
+            except Exception as e:
+                raise Exception(f"Error saving data: {str(e)}")
+
+    def close(self):
+        """Save the unsaved changes and unmap the entry file"""
+        super().close()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._stored = _NO_ENTRIES
+
+    def load_data(self):
+        """Map the entry file and load the invoice state and rollups"""
+        try:
+            if self.meta_file.exists():
+                self.aldo_data.update(read_json_file(self.meta_file))
+            self._open_entries()
+        except Exception as e:
+            raise Exception(f"Error loading data: {str(e)}")
+        self._pending = {}
+
+        # Rebuild the stored rollups if they are missing or out of date
+        rollups = self.aldo_data.get('rollups')
+        if not rollups or rollups.get('entries') != len(self._stored):
+            rollups = HourRollups.from_entries(self._iter_records(self._stored, 0, len(self._stored))).data
+            self.aldo_data['rollups'] = rollups
+        self._rollups = HourRollups(rollups)
+
+    def _open_entries(self):
+        """
+        (Re)map the entry file and check its header
+
+        A previous mapping is left to be closed when the last query using it
+        lets go of it.
+        """
+        with open(self.data_file, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            buffer.close()
+            raise ValueError(f"{self.data_file} is not an Aldo entry file (version {VERSION})")
+        self._map = buffer
+        self._stored = _MappedEntries(buffer, count)
+
+    def _write_entries(self, entries):
+        """
+        Write entries sorted by date to a new entry file and move it into place atomically
+
+        Args:
+            entries: iterable of WorkEntry objects in date order
+        """
+        records = io.BytesIO()
+        blob = io.BytesIO()
+        count = 0
+        for entry in entries:
+            description = entry.description.encode('utf-8')
+            timestamp = entry.timestamp.encode('utf-8')
+            records.write(RECORD.pack(entry.ordinal, entry.hours, blob.tell(), len(description), len(timestamp)))
+            blob.write(description)
+            blob.write(timestamp)
+            count += 1
+
+        data = b''.join([HEADER.pack(MAGIC, VERSION, 0, count), records.getbuffer(), blob.getbuffer()])
+        write_atomic(self.data_file, data, self.durability)
+
+    def save_data(self):
+        """Merge the pending entries into the entry file and save the meta file"""
+        try:
+            if self._pending:
+                pending = sorted(self._pending.values(), key=attrgetter('ordinal'))
+                stored = (
+                    entry for entry in self._iter_records(self._stored, 0, len(self._stored))
+                    if entry.ordinal not in self._pending
+                )
+                self._write_entries(merge(stored, pending, key=attrgetter('ordinal')))
+                self._open_entries()
+                self._pending = {}
+            self._write_json(self.meta_file, self.aldo_data)
+        except Exception as e:
+            raise Exception(f"Error saving data: {str(e)}")
+
+    @staticmethod
+    def _iter_records(stored, start, end):
+        """Iterate over the records of a mapped file between two positions"""
+        for position in range(start, end):
+            yield stored.record(position)
+
+    def _iter_between(self, start_ordinal, end_ordinal):
+        """Iterate over the stored and pending entries between two day ordinals in date order"""
+        stored_entries, pending_entries = self._stored, self._pending
+        start = bisect_left(stored_entries, start_ordinal)
+        end = bisect_right(stored_entries, end_ordinal)
+        stored = (
+            entry for entry in self._iter_records(stored_entries, start, end)
+            if entry.ordinal not in pending_entries
+        )
+        pending = sorted(
+            (entry for ordinal, entry in pending_entries.items() if start_ordinal <= ordinal <= end_ordinal),
+            key=attrgetter('ordinal')
+        )
+        return merge(stored, pending, key=attrgetter('ordinal'))
+
+    def _apply_log_work(self, entry):
+        """Add a work entry to the pending entries, replacing those of its date"""
+        replaced = list(self._iter_between(entry.ordinal, entry.ordinal))
+        self._pending[entry.ordinal] = entry
+        return replaced
+
+    def _snapshot(self):
+        """Capture the invoice state, rollups and pending entries"""
+        return copy.deepcopy(self.aldo_data), dict(self._pending)
+
+    def _restore(self, snapshot):
+        """Roll the invoice state, rollups and pending entries back to a snapshot"""
+        self.aldo_data, self._pending = snapshot
+        self._rollups = HourRollups(self.aldo_data['rollups'])
+
+    def get_work_entries(self, start_date, end_date):
+        """Get work entries within a date range"""
+        return list(self.iter_work_entries(start_date, end_date))
+
+    def iter_work_entries(self, start_date, end_date):
+        """Iterate over work entries within a date range, decoding one record at a time"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        return self._iter_between(date_ordinal(start_str), date_ordinal(end_str))
+
+    def get_entries_for_date(self, date):
+        """Get the work entries logged on a single date"""
+        date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+        ordinal = date_ordinal(date_str)
+        return list(self._iter_between(ordinal, ordinal))
+
+    def _edge_ordinals(self):
+        """Get the day ordinals of the first and last stored and pending entries"""
+        ordinals = list(self._pending)
+        if len(self._stored):
+            ordinals += [self._stored[0], self._stored[len(self._stored) - 1]]
+        return ordinals
+
+    def get_earliest_entry_date(self):
+        """Get the date of the earliest work entry"""
+        ordinals = self._edge_ordinals()
+        return datetime.fromordinal(min(ordinals)).date() if ordinals else None
+
+    def get_latest_entry_date(self):
+        """Get the date of the latest work entry"""
+        ordinals = self._edge_ordinals()
+        return datetime.fromordinal(max(ordinals)).date() if ordinals else None
+
+    def export_data(self):
+        """Export all stored data in the JSON file layout"""
+        aldo_data = dict(self.aldo_data)
+        aldo_data['work_entries'] = list(self._iter_between(1, date_ordinal('9999-12-31')))
+        return aldo_data
+
+    def replace_all(self, aldo_data):
+        """Replace all stored data, e.g. when migrating from another backend"""
+        entries = sorted((WorkEntry.coerce(entry) for entry in aldo_data.get('work_entries', [])),
+                         key=attrgetter('ordinal'))
+
+        self.aldo_data = self._empty_data()
+        self.aldo_data.update({key: value for key, value in aldo_data.items() if key != 'work_entries'})
+        self.aldo_data['rollups'] = HourRollups.from_entries(entries).data
+        self._rollups = HourRollups(self.aldo_data['rollups'])
+        self._pending = {}
+
+        try:
+            self._write_entries(entries)
+            self._open_entries()
+            self._write_json(self.meta_file, self.aldo_data)
+        except Exception as e:
+            raise Exception(f"Error saving data: {str(e)}")
@@ -4,11 +4,18 @@ Aldo CLI - Command-line interface for the Aldo application
 """
 
 import sys
-from aldo.core import cli
+from aldo.daemon import forward
 
 def main():
     """Entry point for the aldo command-line application"""
+    # Let a running 'aldo daemon' run the command, skipping the imports and
+    # file loading below
+    exit_code = forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+    
+    from aldo.core import cli
     cli()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,75 @@
+"""
+JSON codec for Aldo - uses orjson or ujson when installed, the json module otherwise
+"""
+
+import json
+
+from aldo.fileio import write_atomic
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+    # default= is needed for work entries and only exists in ujson 5.2+
+    ujson.dumps(None, default=str)
+except (ImportError, TypeError):
+    ujson = None
+
+# Name of the library used for encoding and decoding, in order of preference
+if orjson is not None:
+    JSON_LIBRARY = 'orjson'
+elif ujson is not None:
+    JSON_LIBRARY = 'ujson'
+else:
+    JSON_LIBRARY = 'json'
+
+def loads(data, library=None):
+    """
+    Decode a JSON document
+
+    Args:
+        data: The document as bytes or str
+        library: Override the library to use (optional, for benchmarks and tests)
+    """
+    library = library or JSON_LIBRARY
+    if library == 'orjson':
+        return orjson.loads(data)
+    if library == 'ujson':
+        return ujson.loads(data)
+    return json.loads(data)
+
+def dumps(data, default=None, compact=False, library=None):
+    """
+    Encode a JSON document
+
+    Args:
+        data: The object to encode
+        default: Function encoding objects the library doesn't know (optional)
+        compact: Leave out indentation and whitespace (optional)
+        library: Override the library to use (optional, for benchmarks and tests)
+
+    Returns:
+        bytes: the UTF-8 encoded document
+    """
+    library = library or JSON_LIBRARY
+    if library == 'orjson':
+        return orjson.dumps(data, default=default, option=0 if compact else orjson.OPT_INDENT_2)
+    if library == 'ujson':
+        return ujson.dumps(data, default=default, indent=0 if compact else 2, ensure_ascii=False).encode('utf-8')
+    if compact:
+        text = json.dumps(data, default=default, separators=(',', ':'), ensure_ascii=False)
+    else:
+        text = json.dumps(data, default=default, indent=2, ensure_ascii=False)
+    return text.encode('utf-8')
+
+def load_file(path, library=None):
+    """Read a JSON document from a file"""
+    with open(path, 'rb') as f:
+        return loads(f.read(), library=library)
+
+def dump_file(path, data, default=None, compact=False, library=None, durability='file'):
+    """Write a JSON document to a file, replacing it atomically (see fileio.write_atomic)"""
+    write_atomic(path, dumps(data, default=default, compact=compact, library=library), durability)
@@ -3,10 +3,12 @@ Configuration management for Aldo
 """
 
 import os
-import json
+import copy
 from pathlib import Path
 import appdirs
 
+from aldo import codec
+
 DEFAULT_CONFIG = {
     "company": {
         "name": "Your Company Name"
@@ -20,6 +22,9 @@ DEFAULT_CONFIG = {
         "footer_text": "Thank you for your business!",
         "last_confirmed_number": None,
         "last_confirmation_date": None
+    },
+    "storage": {
+        "backend": "json"
     }
 }
 
@@ -31,7 +36,7 @@ class Config:
         # Use appdirs to get standard config locations
         self.config_dir = Path(appdirs.user_config_dir("aldo", "aldo"))
         self.config_file = self.config_dir / 'config.json'
-        self.config = DEFAULT_CONFIG.copy()
+        self.config = copy.deepcopy(DEFAULT_CONFIG)
         
         # Load config if it exists
         if self.config_file.exists():
@@ -51,18 +56,16 @@ class Config:
     def load_config(self):
         """Load configuration from file"""
         try:
-            with open(self.config_file, 'r') as f:
-                loaded_config = json.load(f)
-                # Update config with loaded values, keeping defaults for missing keys
-                self._update_nested_dict(self.config, loaded_config)
+            loaded_config = codec.load_file(self.config_file)
+            # Update config with loaded values, keeping defaults for missing keys
+            self._update_nested_dict(self.config, loaded_config)
         except Exception as e:
             raise Exception(f"Error loading configuration: {str(e)}")
     
     def save_config(self):
         """Save configuration to file"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=2)
+            codec.dump_file(self.config_file, self.config)
         except Exception as e:
             raise Exception(f"Error saving configuration: {str(e)}")
     
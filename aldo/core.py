@@ -9,42 +9,50 @@ import sys
 import click
 import traceback
 from datetime import datetime, timedelta
-from aldo.storage import WorkHoursStorage
+from pathlib import Path
+from aldo.storage import STORAGE_BACKENDS, open_storage
 from aldo.config import Config
-from aldo.invoice import InvoiceGenerator
+from aldo.timesheets import (
+    TIMESHEET_FORMATS, parse_date, parse_hours, detect_format, read_timesheet, write_timesheet
+)
 from aldo import __version__
 
-# Initialize global config and storage
-config = Config()
-storage = WorkHoursStorage()
+# Global config and storage, created on first use by a command so that
+# --help, --version and shell completion don't read any files
+_config = None
+_storage = None
+
+def get_config():
+    """Get the global configuration, loading (or creating) it on first use"""
+    global _config
+    if _config is None:
+        _config = Config()
+        _config.ensure_config_exists()
+    return _config
+
+def get_storage():
+    """Get the global storage, opening the configured backend on first use"""
+    global _storage
+    if _storage is None:
+        _storage = open_storage(get_config())
+    return _storage
 
 def validate_date(ctx, param, value):
     """Validate date format (YYYY-MM-DD) or handle aliases"""
     if not value:
         return value
     
-    # Handle date aliases
-    today = datetime.now().date()
-    if value == "today":
-        return today
-    elif value == "yesterday":
-        return today - timedelta(days=1)
-    elif value == "tomorrow":
-        return today + timedelta(days=1)
-    elif value == "daybefore":
-        return today - timedelta(days=2)
-    
-    # Handle regular date format
     try:
-        return datetime.strptime(value, '%Y-%m-%d').date()
-    except ValueError:
-        raise click.BadParameter('Date must be in YYYY-MM-DD format or one of: today, yesterday, tomorrow, daybefore')
+        return parse_date(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
 
 def validate_hours(ctx, param, value):
     """Validate hours (must be a positive number)"""
-    if value <= 0:
-        raise click.BadParameter('Hours must be a positive number')
-    return value
+    try:
+        return parse_hours(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
 
 @click.group()
 @click.version_option(version=__version__)
@@ -54,9 +62,8 @@ def cli():
 
     A command-line tool to log work hours, view summaries, and generate invoices.
     """
-    # Ensure config and data directories exist
-    config.ensure_config_exists()
-    storage.ensure_storage_exists()
+    # The config and data directories are created when a command first uses
+    # them, see get_config() and get_storage()
 
 @cli.command('log')
 @click.argument('date', callback=validate_date)
@@ -73,6 +80,7 @@ def log_work(date, hours, description=""):
     If a log entry already exists for the specified date, it will be replaced.
     """
     try:
+        storage = get_storage()
         storage.log_work(date, hours, description)
         date_str = date.strftime('%Y-%m-%d')
         if description:
@@ -83,6 +91,64 @@ def log_work(date, hours, description=""):
         click.echo(f"Error logging work: {str(e)}", err=True)
         sys.exit(1)
 
+@cli.command('import')
+@click.argument('file', type=click.File('r'))
+@click.option('--format', 'file_format', type=click.Choice(TIMESHEET_FORMATS),
+              help='Timesheet format (default: guessed from the file name, CSV otherwise)')
+def import_work(file, file_format):
+    """
+    Import work hours from a CSV or JSONL timesheet.
+
+    FILE: Timesheet to import, or - to read from standard input
+
+    CSV files need a header row with 'date' and 'hours' columns and may have
+    a 'description' column; JSONL files hold one object per line with the
+    same keys. Rows are validated like 'aldo log' arguments and replace any
+    existing entry for their date. The import is saved once at the end and
+    nothing is saved if any row is invalid.
+    """
+    try:
+        storage = get_storage()
+        file_format = file_format or detect_format(file.name)
+        count = storage.log_many(read_timesheet(file, file_format))
+        click.echo(f"Imported {count} entries from {file.name}")
+    except Exception as e:
+        click.echo(f"Error importing work: {str(e)}", err=True)
+        sys.exit(1)
+
+@cli.command('export')
+@click.option('--from', 'start_date', callback=validate_date, help='First date to export (default: earliest entry)')
+@click.option('--to', 'end_date', callback=validate_date, help='Last date to export (default: latest entry)')
+@click.option('--format', 'file_format', type=click.Choice(TIMESHEET_FORMATS), default='csv',
+              help='Output format (default: csv)')
+@click.option('--output', '-o', 'output_name', type=click.Path(dir_okay=False, allow_dash=True), default='-',
+              help='Output file (default: standard output)')
+def export_work(start_date, end_date, file_format, output_name):
+    """
+    Export work entries as CSV or JSONL.
+
+    Entries are streamed in date order, so exports of long histories don't
+    need to fit in memory. Dates accept the same aliases as 'aldo log'.
+    """
+    try:
+        storage = get_storage()
+        start_date = start_date or storage.get_earliest_entry_date()
+        end_date = end_date or storage.get_latest_entry_date()
+        if start_date is None or end_date is None:
+            entries = iter(())
+        else:
+            entries = storage.iter_work_entries(start_date, end_date)
+        
+        with click.open_file(output_name, 'w') as output:
+            count = write_timesheet(output, entries, file_format)
+        # Standard output may be captured by 'aldo daemon', so check the
+        # option rather than the name of the stream
+        if output_name != '-':
+            click.echo(f"Exported {count} entries to {output_name}")
+    except Exception as e:
+        click.echo(f"Error exporting work: {str(e)}", err=True)
+        sys.exit(1)
+
 @cli.command('summary')
 @click.argument('period', type=click.Choice(['week', 'month', 'year']), required=False)
 def view_summary(period):
@@ -92,9 +158,10 @@ def view_summary(period):
     PERIOD: One of: 'week', 'month', or 'year'. If not provided, shows all entries since last confirmed invoice.
     """
     try:
+        storage = get_storage()
         if period:
             # Existing logic for specific periods
-            summary = storage.get_summary(period)
+            start_date, end_date = storage.get_period_range(period)
             title = period.upper()
         else:
             # New logic for entries since last confirmed invoice
@@ -114,18 +181,9 @@ def view_summary(period):
                 start_date = last_end_date + timedelta(days=1)
                 end_date = datetime.now().date()
                 title = f"SINCE LAST INVOICE ({last_confirmed.end_date})"
-            
-            # Get entries and convert to summary format
-            entries = storage.get_work_entries(start_date, end_date)
-            summary = {}
-            for entry in entries:
-                date = entry["date"]
-                if date not in summary:
-                    summary[date] = []
-                summary[date].append({
-                    "hours": entry["hours"],
-                    "description": entry["description"]
-                })
+        
+        # Daily and total hours come from the rollups, not the raw entries
+        daily_totals = storage.get_daily_totals(start_date, end_date)
         
         # Print summary header
         click.echo(f"\n{'='*30}")
@@ -133,7 +191,7 @@ def view_summary(period):
         click.echo(f"{'='*30}")
 
         click.echo("")
-        if not summary:
+        if not daily_totals:
             if period:
                 click.echo("No work hours recorded for this period.")
             else:
@@ -141,13 +199,11 @@ def view_summary(period):
             return
 
         # Print details
-        total_hours = 0
-        for date_str, entries in summary.items():
-            day_hours = sum(entry['hours'] for entry in entries)
-            total_hours += day_hours
+        for date_str, day_hours in daily_totals.items():
             click.echo(f"{date_str}: {day_hours:.2f} hours")
         
         # Print total
+        total_hours = storage.total_hours(start_date, end_date)
         click.echo(f"\n{'-'*30}")
         click.echo(f"TOTAL HOURS: {total_hours:.2f}")
         click.echo(f"{'='*30}\n")
@@ -156,6 +212,27 @@ def view_summary(period):
         click.echo(f"Error getting summary: {str(e)}", err=True)
         sys.exit(1)
 
+@cli.command('total')
+@click.argument('start_date', callback=validate_date)
+@click.argument('end_date', callback=validate_date)
+def view_total(start_date, end_date):
+    """
+    Show the total hours worked between two dates.
+
+    START_DATE: First date of the range (YYYY-MM-DD or an alias like 'aldo log')
+    END_DATE: Last date of the range, inclusive
+    """
+    if start_date > end_date:
+        raise click.BadParameter('END_DATE must not be before START_DATE', param_hint='END_DATE')
+    
+    try:
+        storage = get_storage()
+        total_hours = storage.total_hours(start_date, end_date)
+        click.echo(f"Total hours from {start_date} to {end_date}: {total_hours:.2f}")
+    except Exception as e:
+        click.echo(f"Error getting total: {str(e)}", err=True)
+        sys.exit(1)
+
 def _parse_invoice_input(input_value):
     """Parse input as either invoice number or date and return appropriate values"""
     today = datetime.now().date()
@@ -169,7 +246,7 @@ def _parse_invoice_input(input_value):
     if isinstance(input_value, str):
         try:
             # Check if it might be a full invoice ID with prefix
-            prefix = config.config['invoice']['prefix']
+            prefix = get_config().config['invoice']['prefix']
             if input_value.startswith(prefix):
                 invoice_number = int(input_value[len(prefix):])
                 is_invoice_number = True
@@ -212,10 +289,18 @@ def _ensure_date_object(date_value, default_date=None):
     except (ValueError, TypeError):
         return default_date
 
+def _invoice_cache(config, storage):
+    """Get the cache of rendered invoice PDFs, kept in the data directory"""
+    from aldo.invoice_cache import InvoiceCache, DEFAULT_CACHE_MAX_BYTES
+    max_bytes = config.config['invoice'].get('cache_max_bytes', DEFAULT_CACHE_MAX_BYTES)
+    return InvoiceCache(storage.data_dir / 'invoice_cache', max_bytes)
+
 @cli.command('generate-invoice')
 @click.argument('invoice_or_end_date', required=False)
 @click.option('--output', '-o', default='invoice.pdf', help='Output PDF filename')
-def generate_invoice(invoice_or_end_date, output):
+@click.option('--no-cache', is_flag=True,
+              help='Render a confirmed invoice again instead of copying the cached PDF, replacing it')
+def generate_invoice(invoice_or_end_date, output, no_cache):
     """
     Generate a PDF invoice.
 
@@ -231,8 +316,12 @@ def generate_invoice(invoice_or_end_date, output):
        - If an invoice number is provided (format: number or INV-number), it will regenerate that invoice
        - This is useful for viewing past invoices that have been confirmed
        - Example: aldo generate-invoice 1000 or aldo generate-invoice INV-1000
+       - The PDF is copied from the invoice cache if it was rendered before
+         with the same entries and config (--no-cache renders it again)
     """
     try:
+        config = get_config()
+        storage = get_storage()
         today = datetime.now().date()
         is_invoice_number, invoice_number, parsed_date = _parse_invoice_input(invoice_or_end_date)
         
@@ -291,9 +380,23 @@ def generate_invoice(invoice_or_end_date, output):
             click.echo(f"No work hours recorded between {start_date} and {end_date}.")
             return
             
-        # Generate the invoice
-        invoice_generator = InvoiceGenerator(config, storage)
-        output_path = invoice_generator.generate_invoice(full_invoice_number, start_date, end_date, entries, output)
+        # Confirmed invoices can't change, so a regenerated one is copied from
+        # the PDF cache unless something it shows changed
+        cache = cache_key = output_path = None
+        if is_invoice_number:
+            cache = _invoice_cache(config, storage)
+            total_hours = storage.get_total_hours(entries)
+            cache_key = cache.key(config, full_invoice_number, start_date, end_date, entries, total_hours)
+            if not no_cache:
+                output_path = cache.fetch(cache_key, output)
+        
+        if output_path is None:
+            # Generate the invoice, importing the PDF stack only now that it is needed
+            from aldo.invoice import InvoiceGenerator
+            invoice_generator = InvoiceGenerator(config, storage)
+            output_path = invoice_generator.generate_invoice(full_invoice_number, start_date, end_date, entries, output)
+            if cache is not None:
+                cache.store(cache_key, output_path)
         
         # Store unconfirmed invoice for new invoices only (not for regenerating existing ones)
         if not is_invoice_number:
@@ -313,6 +416,90 @@ def generate_invoice(invoice_or_end_date, output):
         click.echo(traceback.format_exc())
         sys.exit(1)
 
+@cli.command('regenerate-invoices')
+@click.option('--all', 'all_invoices', is_flag=True, help='Regenerate every confirmed invoice')
+@click.option('--from', 'first_number', type=int, help='First invoice number to regenerate')
+@click.option('--to', 'last_number', type=int, help='Last invoice number to regenerate')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), help='Number of worker processes (default: number of CPUs)')
+@click.option('--output-dir', '-d', type=click.Path(file_okay=False), default='.',
+              help='Directory for the PDFs, named after the invoice numbers (default: current directory)')
+@click.option('--no-cache', is_flag=True, help='Render every invoice instead of copying cached PDFs, replacing them')
+def regenerate_invoices(all_invoices, first_number, last_number, jobs, output_dir, no_cache):
+    """
+    Regenerate the PDFs of confirmed invoices in parallel.
+
+    Select the invoices with --all or with a range of invoice numbers
+    (--from and/or --to, inclusive). Invoices found in the invoice cache
+    are copied from it; each worker process sets up the PDF styles once and
+    renders its share of the others.
+    """
+    if all_invoices == (first_number is not None or last_number is not None):
+        raise click.UsageError('Use either --all or --from/--to')
+    
+    try:
+        config = get_config()
+        storage = get_storage()
+        prefix = config.config['invoice']['prefix']
+        
+        numbers = sorted(int(number) for number in storage.aldo_data['confirmed_invoices'])
+        if not all_invoices:
+            numbers = [
+                number for number in numbers
+                if (first_number is None or number >= first_number) and (last_number is None or number <= last_number)
+            ]
+        if not numbers:
+            click.echo("No confirmed invoices to regenerate.")
+            return
+        
+        # The workers have no storage, so each job carries its entries and total
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        invoice_jobs = []
+        for number in numbers:
+            invoice = storage.get_invoice_by_number(number, config)
+            start_date = _ensure_date_object(invoice.start_date)
+            end_date = _ensure_date_object(invoice.end_date)
+            full_invoice_number = f"{prefix}{number:04d}"
+            entries = storage.get_work_entries(start_date, end_date)
+            invoice_jobs.append({
+                'invoice_number': full_invoice_number,
+                'start_date': start_date,
+                'end_date': end_date,
+                'entries': entries,
+                'output_filename': str(Path(output_dir) / f"{full_invoice_number}.pdf"),
+                'total_hours': storage.get_total_hours(entries),
+            })
+        
+        cache = _invoice_cache(config, storage)
+        cache_keys = {}
+        uncached_jobs = []
+        for job in invoice_jobs:
+            cache_key = cache.key(config, job['invoice_number'], job['start_date'], job['end_date'],
+                                  job['entries'], job['total_hours'])
+            output_path = None if no_cache else cache.fetch(cache_key, job['output_filename'])
+            if output_path is None:
+                cache_keys[job['invoice_number']] = cache_key
+                uncached_jobs.append(job)
+            else:
+                click.echo(f"Invoice #{job['invoice_number']} regenerated from cache: {output_path}")
+        
+        failed = 0
+        if uncached_jobs:
+            from aldo.invoice import generate_invoices
+            for job, result in generate_invoices(config, uncached_jobs, jobs):
+                if isinstance(result, Exception):
+                    failed += 1
+                    click.echo(f"Error generating invoice #{job['invoice_number']}: {str(result)}", err=True)
+                    continue
+                cache.store(cache_keys[job['invoice_number']], result)
+                click.echo(f"Invoice #{job['invoice_number']} regenerated: {result}")
+        
+        if failed:
+            click.echo(f"Error: {failed} of {len(invoice_jobs)} invoices failed.", err=True)
+            sys.exit(1)
+    except Exception as e:
+        click.echo(f"Error regenerating invoices: {str(e)}", err=True)
+        sys.exit(1)
+
 @cli.command('confirm')
 @click.argument('invoice_number', required=True)
 def confirm_invoice(invoice_number):
@@ -329,6 +516,8 @@ def confirm_invoice(invoice_number):
     The invoice being confirmed must match the last unconfirmed invoice.
     """
     try:
+        config = get_config()
+        storage = get_storage()
         # Format the expected invoice number for display
         prefix = config.config['invoice']['prefix']
         
@@ -351,4 +540,214 @@ def confirm_invoice(invoice_number):
             
     except Exception as e:
         click.echo(f"Error confirming invoice: {str(e)}", err=True)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+@cli.command('migrate-storage')
+@click.argument('backend', type=click.Choice(STORAGE_BACKENDS))
+def migrate_storage(backend):
+    """
+    Copy all data to another storage backend and switch to it.
+
+    BACKEND: One of: 'json' (single aldo_data.json file), 'journal' (JSON file
+    plus an append-only log of changes), 'sharded' (one JSON file per year,
+    loaded on demand), 'sqlite' (indexed database) or 'binary' (fixed-width
+    records read through mmap)
+    
+    The data of the current backend is left in place, so switching back with
+    another migration is always possible.
+    """
+    try:
+        config = get_config()
+        storage = get_storage()
+        current_backend = config.config['storage']['backend']
+        if backend == current_backend:
+            click.echo(f"Already using the '{backend}' storage backend.")
+            return
+        
+        target = open_storage(config, backend)
+        target.replace_all(storage.export_data())
+        config.update_config({'storage': {'backend': backend}})
+        
+        click.echo(f"Migrated data from '{current_backend}' to '{backend}' storage: {target.data_file}")
+    except Exception as e:
+        click.echo(f"Error migrating storage: {str(e)}", err=True)
+        sys.exit(1)
+
+@cli.command('daemon')
+@click.option('--stop', is_flag=True, help='Stop the running daemon')
+def daemon(stop):
+    """
+    Keep the config and data loaded and run commands from other aldo processes.
+
+    While the daemon runs, 'aldo log', 'summary', 'total', 'export',
+    'generate-invoice' and 'confirm' are sent to it over a Unix socket in the
+    data directory instead of loading everything on their own. Without a
+    daemon (or with ALDO_NO_DAEMON set) every command runs in its own process
+    as usual. The daemon runs in the foreground until it is interrupted or
+    stopped with 'aldo daemon --stop'.
+    """
+    from aldo import daemon as aldo_daemon
+    try:
+        if stop:
+            if aldo_daemon.stop():
+                click.echo("Daemon stopped.")
+            else:
+                click.echo("No daemon is running.")
+            return
+        
+        # Shut down cleanly (saving and removing the socket) on kill
+        import signal
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        server = aldo_daemon.Daemon()
+        click.echo(f"Aldo daemon listening on {server.path}")
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        click.echo(f"Error running daemon: {str(e)}", err=True)
+        sys.exit(1)
+
+# Commands that can't be run from inside 'aldo shell' or 'aldo batch'
+NESTED_EXCLUDED_COMMANDS = ('shell', 'batch', 'daemon', 'migrate-storage')
+
+def run_command(args):
+    """
+    Run an aldo command in this process, as if its arguments were given on the command line
+    
+    Args:
+        args: The command-line arguments, without the program name
+        
+    Returns:
+        int: The exit code of the command
+    """
+    try:
+        cli.main(args, prog_name='aldo')
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        click.echo(e.code, err=True)
+        return 1
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        return 1
+    return 0
+
+def _shell_loop():
+    """Read and run commands until end of input or 'exit'"""
+    import shlex
+    try:
+        # Line editing and history for input(), where available
+        import readline
+    except ImportError:
+        pass
+    
+    prompt = 'aldo> ' if sys.stdin.isatty() else ''
+    while True:
+        try:
+            line = input(prompt)
+        except EOFError:
+            if prompt:
+                click.echo()
+            return
+        except KeyboardInterrupt:
+            click.echo()
+            continue
+        
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            click.echo(f"Error: {str(e)}", err=True)
+            continue
+        if not args:
+            continue
+        if args[0] in ('exit', 'quit'):
+            return
+        if args[0] == 'help':
+            args = args[1:] + ['--help']
+        if args[0] in NESTED_EXCLUDED_COMMANDS:
+            click.echo(f"Error: 'aldo {args[0]}' can't be run from the shell.", err=True)
+            continue
+        
+        # Pick up changes made by other aldo processes since the last command
+        get_storage().refresh()
+        run_command(args)
+
+@cli.command('shell')
+@click.option('--batch', is_flag=True, help='Save all changes once, when the shell exits')
+def shell(batch):
+    """
+    Run aldo commands interactively with the config and data loaded once.
+
+    Commands are entered as on the command line without the leading 'aldo',
+    e.g. 'log today 4' or 'summary month'. 'help' lists the commands and
+    'exit', 'quit' or end of input leaves the shell. Changes are saved after
+    each command that makes them.
+    
+    With --batch, all changes are saved once when the shell exits, on top of
+    the changes other aldo processes saved meanwhile (with the journal and
+    SQLite backends, other aldo processes wait to change the data until then).
+    """
+    try:
+        storage = get_storage()
+        if batch:
+            with storage.batch():
+                _shell_loop()
+        else:
+            _shell_loop()
+    except Exception as e:
+        click.echo(f"Error running shell: {str(e)}", err=True)
+        sys.exit(1)
+
+@cli.command('batch')
+@click.argument('file', type=click.File('r'))
+@click.option('--keep-going', is_flag=True, help='Run the remaining commands after a failed one and save their changes')
+def run_batch(file, keep_going):
+    """
+    Run a script of aldo commands with a single save.
+
+    FILE: Script with one command per line, as on the command line without
+    the leading 'aldo' (e.g. 'log 2025-05-15 5 "Client meeting"'), or - to
+    read from standard input. Blank lines and # comments are skipped.
+    
+    All changes are saved once at the end. If a command fails, the script
+    stops and nothing is saved, unless --keep-going is given.
+    """
+    import shlex
+    
+    try:
+        # Check the whole script before running any of it
+        commands = []
+        for line_number, line in enumerate(file, 1):
+            try:
+                args = shlex.split(line, comments=True)
+            except ValueError as e:
+                raise click.ClickException(f"line {line_number}: {str(e)}")
+            if not args:
+                continue
+            if args[0] in NESTED_EXCLUDED_COMMANDS:
+                raise click.ClickException(f"line {line_number}: 'aldo {args[0]}' can't be run from a batch")
+            commands.append((line_number, args))
+        
+        failed = []
+        storage = get_storage()
+        with storage.batch():
+            for line_number, args in commands:
+                exit_code = run_command(args)
+                if exit_code:
+                    failed.append(line_number)
+                    if not keep_going:
+                        raise click.ClickException(
+                            f"line {line_number}: '{shlex.join(args)}' failed with exit code {exit_code}, "
+                            "no changes were saved"
+                        )
+        
+        if failed:
+            click.echo(f"Error: {len(failed)} of {len(commands)} commands failed "
+                       f"(lines {', '.join(map(str, failed))})", err=True)
+            sys.exit(1)
+    except click.ClickException as e:
+        click.echo(f"Error running batch: {e.message}", err=True)
+        sys.exit(1)
+    except Exception as e:
+        click.echo(f"Error running batch: {str(e)}", err=True)
+        sys.exit(1)
@@ -0,0 +1,247 @@
+"""
+Aldo daemon - keeps the config and storage loaded and runs commands sent over a Unix socket
+
+The client half (socket_path() and forward()) is imported by every 'aldo'
+run, so it must not import click, the storage or the PDF stack.
+"""
+
+import os
+import sys
+import socket
+from pathlib import Path
+import appdirs
+
+from aldo import codec
+
+# Name of the socket inside the data directory
+SOCKET_FILENAME = 'aldo.sock'
+
+# Commands the client hands to a running daemon; all others (and commands
+# reading standard input or exporting to standard output) always run in the
+# calling process
+FORWARDED_COMMANDS = ('log', 'summary', 'total', 'export', 'generate-invoice', 'confirm')
+
+# Set to run every command in the calling process even if a daemon is running
+NO_DAEMON_VARIABLE = 'ALDO_NO_DAEMON'
+
+def socket_path():
+    """Get the path of the daemon socket"""
+    return Path(appdirs.user_data_dir("aldo", "aldo")) / SOCKET_FILENAME
+
+def _send(request):
+    """
+    Send a request to the daemon and read its response
+
+    Returns:
+        dict: The response, or None if no daemon is listening
+    """
+    path = socket_path()
+    if not path.exists():
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(path))
+        except (FileNotFoundError, ConnectionRefusedError):
+            # Socket file left behind by a daemon that didn't shut down cleanly
+            return None
+        client.sendall(codec.dumps(request, compact=True))
+        client.shutdown(socket.SHUT_WR)
+        return codec.loads(_read_all(client))
+
+def _read_all(connection):
+    """Read from a connection until the other side stops sending"""
+    chunks = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+def _export_output(args):
+    """Get the --output/-o value of 'aldo export' arguments, '-' (standard output) if not given"""
+    output = '-'
+    options = iter(args)
+    for arg in options:
+        if arg in ('--output', '-o'):
+            output = next(options, '-')
+        elif arg.startswith('--output='):
+            output = arg[len('--output='):]
+        elif arg.startswith('-o'):
+            output = arg[len('-o'):]
+    return output
+
+def forward(args):
+    """
+    Run a command in the daemon if one is running
+
+    Args:
+        args: The command-line arguments, without the program name
+
+    Returns:
+        int: The exit code of the command, or None if it must run in this process
+    """
+    if not args or args[0] not in FORWARDED_COMMANDS or os.environ.get(NO_DAEMON_VARIABLE):
+        return None
+    if '-' in args[1:]:
+        # The daemon can't read this process's standard input
+        return None
+    if args[0] == 'export' and _export_output(args[1:]) == '-':
+        # The daemon would have to buffer the whole export instead of
+        # streaming it to standard output
+        return None
+    try:
+        response = _send({'args': list(args), 'cwd': os.getcwd()})
+    except OSError:
+        return None
+    if response is None:
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stdout.flush()
+    sys.stderr.write(response['stderr'])
+    sys.stderr.flush()
+    return response['exit_code']
+
+def stop():
+    """
+    Ask a running daemon to shut down
+
+    Returns:
+        bool: True if a daemon was running
+    """
+    try:
+        return _send({'stop': True}) is not None
+    except OSError:
+        return False
+
+class Daemon:
+    """
+    Serves aldo commands over a Unix socket
+
+    Requests are handled one at a time, each running the command through the
+    click group in aldo.core with the client's arguments and working
+    directory and sending back its output and exit code. The config and
+    storage stay loaded between requests: the storage is refreshed from disk
+    if another process changed the data files, and both are reloaded if the
+    config file changed.
+    """
+
+    def __init__(self, path=None):
+        """Initialize the daemon with the socket path (optional, defaults to socket_path())"""
+        self.path = Path(path) if path else socket_path()
+        self._config_signature = None
+        self._running = False
+
+    def serve(self):
+        """Listen on the socket and handle requests until asked to stop"""
+        from aldo import core
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(str(self.path))
+                except (FileNotFoundError, ConnectionRefusedError):
+                    # Left behind by a daemon that didn't shut down cleanly
+                    self.path.unlink()
+                else:
+                    raise Exception(f"A daemon is already listening on {self.path}")
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the user running the daemon may connect to it
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(str(self.path))
+        finally:
+            os.umask(old_umask)
+        server.listen()
+
+        # Load the config and storage before the first request
+        core.get_storage()
+        self._config_signature = self._config_file_signature()
+
+        self._running = True
+        try:
+            while self._running:
+                connection, _ = server.accept()
+                with connection:
+                    try:
+                        request = codec.loads(_read_all(connection))
+                        if not isinstance(request, dict):
+                            raise ValueError("request is not an object")
+                    except (OSError, ValueError):
+                        # A truncated or garbled request, or a client that
+                        # went away; only this connection is dropped
+                        continue
+                    response = self.handle(request)
+                    try:
+                        connection.sendall(codec.dumps(response, compact=True))
+                    except OSError:
+                        # The client was interrupted (e.g. with Ctrl-C)
+                        continue
+        finally:
+            server.close()
+            self.path.unlink(missing_ok=True)
+            if core._storage is not None:
+                core._storage.close()
+
+    def handle(self, request):
+        """
+        Handle a single request
+
+        Returns:
+            dict: The response, with the command's 'stdout', 'stderr' and 'exit_code'
+        """
+        if request.get('stop'):
+            self._running = False
+            return {'stdout': '', 'stderr': '', 'exit_code': 0}
+
+        cwd = os.getcwd()
+        try:
+            self._refresh()
+            os.chdir(request['cwd'])
+        except Exception as e:
+            return {'stdout': '', 'stderr': f"Error: {str(e)}\n", 'exit_code': 1}
+        try:
+            return self._run(request['args'])
+        finally:
+            os.chdir(cwd)
+
+    def _config_file_signature(self):
+        """Get the (mtime, size) of the config file, None if it is missing"""
+        from aldo import core
+        try:
+            stat = os.stat(core.get_config().config_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        """Reload the config and storage if they were changed outside of the daemon"""
+        from aldo import core
+        signature = self._config_file_signature()
+        if signature != self._config_signature:
+            if core._storage is not None:
+                core._storage.close()
+            core._config = core._storage = None
+            self._config_signature = self._config_file_signature()
+        core.get_storage().refresh()
+
+    @staticmethod
+    def _run(args):
+        """Run a command with its output captured"""
+        import io
+        from contextlib import redirect_stdout, redirect_stderr
+        from aldo import core
+
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        stderr = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exit_code = core.run_command(args)
+            stdout.flush()
+            stderr.flush()
+
+        return {
+            'stdout': stdout.buffer.getvalue().decode('utf-8'),
+            'stderr': stderr.buffer.getvalue().decode('utf-8'),
+            'exit_code': exit_code,
+        }
@@ -0,0 +1,64 @@
+"""
+File writing for Aldo - replaces data files atomically with a configurable durability
+"""
+
+import os
+import shutil
+
+# How hard a write tries to survive a power loss, selected with 'storage.durability':
+# 'none' only renames, 'file' also fsyncs the file, 'dir' also fsyncs its directory
+DURABILITY_LEVELS = ('none', 'file', 'dir')
+
+def check_durability(durability):
+    """Check a durability level, returning it"""
+    if durability not in DURABILITY_LEVELS:
+        raise ValueError(f"Invalid durability: {durability}. Expected one of: {', '.join(DURABILITY_LEVELS)}")
+    return durability
+
+def fsync_directory(path):
+    """Flush the directory entries of a directory to disk"""
+    if os.name == 'nt':
+        # Directories can't be opened (or synced) on Windows
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_atomic(path, data, durability='file'):
+    """
+    Replace a file with new contents without ever leaving it half written
+
+    The data is written to a temporary file in the same directory, which is
+    then renamed over the file. A crash leaves either the old or the new
+    contents, never a truncated file. The file keeps its permissions.
+
+    Args:
+        path: Path of the file to replace
+        data: The new contents as bytes
+        durability: One of DURABILITY_LEVELS
+    """
+    check_durability(durability)
+    temp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(temp_path, 'wb') as f:
+            # Keep the permissions of the file being replaced, as writing it
+            # in place would, before any of the data is written
+            try:
+                shutil.copymode(path, temp_path)
+            except FileNotFoundError:
+                pass
+            f.write(data)
+            if durability != 'none':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+        raise
+    if durability == 'dir':
+        fsync_directory(path.parent)
@@ -11,6 +11,7 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from concurrent.futures import ProcessPoolExecutor
 
 class InvoiceGenerator:
     """Generates PDF invoices based on work hours data"""
@@ -65,8 +66,13 @@ class InvoiceGenerator:
             alignment=1  # Center
         ))
     
-    def generate_invoice(self, invoice_number, start_date, end_date, entries, output_filename):
-        """Generate a PDF invoice for the given date range and entries"""
+    def generate_invoice(self, invoice_number, start_date, end_date, entries, output_filename, total_hours=None):
+        """
+        Generate a PDF invoice for the given date range and entries
+        
+        Args:
+            total_hours: Total hours of the entries (optional, summed from the entries by default)
+        """
         # Get config data
         cfg = self.config.get_config()
         company = cfg.get('company', {'name': 'Your Company Name'})
@@ -74,7 +80,8 @@ class InvoiceGenerator:
         payment = cfg.get('payment', {'hourly_rate': 50.00})
         
         # Calculate total amount
-        total_hours = self.storage.get_total_hours(entries)
+        if total_hours is None:
+            total_hours = self.storage.get_total_hours(entries)
         hourly_rate = payment['hourly_rate']
         total_amount = total_hours * hourly_rate
         
@@ -186,4 +193,48 @@ class InvoiceGenerator:
         # Build the PDF
         doc.build(elements)
         
-        return str(output_path)
\ No newline at end of file
+        return str(output_path)
+
+# Invoice generator of a generate_invoices() worker process, built once and
+# reused for all invoices the process renders
+_worker_generator = None
+
+def _init_worker(config):
+    """Build the invoice generator of a worker process"""
+    global _worker_generator
+    _worker_generator = InvoiceGenerator(config, None)
+
+def _render_invoice(job):
+    """Render one invoice in a worker process"""
+    return _worker_generator.generate_invoice(**job)
+
+def generate_invoices(config, jobs, max_workers=None):
+    """
+    Generate several invoices in parallel worker processes
+    
+    Args:
+        config: The configuration object
+        jobs: list of dicts of generate_invoice() arguments, including total_hours
+              since the workers have no storage
+        max_workers: Number of worker processes (optional, defaults to the number of CPUs);
+                     with 1, the invoices are generated in this process
+    
+    Yields:
+        (job, output path or the exception that failed it), in the order of jobs
+    """
+    if max_workers == 1 or len(jobs) <= 1:
+        generator = InvoiceGenerator(config, None)
+        for job in jobs:
+            try:
+                yield job, generator.generate_invoice(**job)
+            except Exception as e:
+                yield job, e
+        return
+    
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(config,)) as executor:
+        futures = [executor.submit(_render_invoice, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                yield job, future.result()
+            except Exception as e:
+                yield job, e
@@ -0,0 +1,104 @@
+"""
+Cache of rendered invoice PDFs for Aldo, keyed on a hash of everything the PDF shows
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+from aldo import __version__
+from aldo.fileio import write_atomic
+
+# Version of the invoice layout; bump it when a change to aldo.invoice
+# changes the rendered PDFs, so invoices cached before are rendered again
+INVOICE_LAYOUT_VERSION = 1
+
+# Config sections whose values appear on the invoices
+INVOICE_CONFIG_SECTIONS = ('company', 'client', 'payment')
+
+# Default size limit of the cache ('invoice.cache_max_bytes')
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+class InvoiceCache:
+    """
+    Content-addressed store of rendered invoice PDFs
+
+    Each PDF is stored as <key>.pdf, the key being a hash of the invoice
+    number, period, entries, total, the config values shown on the invoice
+    and the renderer version, so a cached PDF is only reused if it would be
+    rendered the same. Hits touch the file, and once the cache grows past its
+    size limit the least recently used PDFs are removed.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory holding the cached PDFs, created on first store
+            max_bytes: Size limit of all cached PDFs together
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(config, invoice_number, start_date, end_date, entries, total_hours):
+        """Get the cache key of an invoice, with the arguments of InvoiceGenerator.generate_invoice()"""
+        cfg = config.get_config()
+        content = {
+            'renderer': [__version__, INVOICE_LAYOUT_VERSION],
+            'invoice_number': invoice_number,
+            'period': [str(start_date), str(end_date)],
+            'entries': [[entry['date'], entry['hours'], entry.get('description') or ''] for entry in entries],
+            'total_hours': float(total_hours),
+            'config': {section: cfg.get(section) for section in INVOICE_CONFIG_SECTIONS},
+        }
+        encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        """Path of the cached PDF of a key"""
+        return self.cache_dir / f"{key}.pdf"
+
+    def fetch(self, key, output_filename):
+        """
+        Copy a cached PDF to the output file
+
+        Returns:
+            str: The absolute output path, or None if the PDF isn't cached
+        """
+        path = self._path(key)
+        output_path = Path(output_filename).resolve()
+        try:
+            shutil.copyfile(path, output_path)
+        except FileNotFoundError:
+            return None
+        # Mark the PDF as recently used for eviction
+        os.utime(path)
+        return str(output_path)
+
+    def store(self, key, pdf_path):
+        """Add a rendered PDF to the cache, then evict PDFs over the size limit"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(pdf_path, 'rb') as f:
+            write_atomic(self._path(key), f.read(), 'none')
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used PDFs until the cache fits its size limit"""
+        files = []
+        for path in self.cache_dir.glob('*.pdf'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
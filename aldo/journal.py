@@ -0,0 +1,154 @@
+"""
+Journaled storage for Aldo - appends mutations to a log instead of rewriting the data file
+"""
+
+import os
+
+from aldo import codec
+from aldo.fileio import fsync_directory
+from aldo.storage import WorkHoursStorage, json_default
+
+# Compact the journal into the data file once it grows past this size
+DEFAULT_JOURNAL_MAX_BYTES = 1024 * 1024
+
+class JournaledWorkHoursStorage(WorkHoursStorage):
+    """
+    Keeps aldo_data.json as a snapshot and appends every mutation to a journal
+
+    Each call to log_work, store_unconfirmed_invoice or confirm_invoice writes
+    a single JSON line to aldo_data.journal.jsonl next to the snapshot. The
+    journal is replayed on load and folded into the snapshot once it passes
+    the 'storage.journal_max_bytes' setting. All journal operations are
+    idempotent, so replaying records already contained in the snapshot (after
+    a crash during compaction) is harmless.
+    """
+
+    journal_filename = 'aldo_data.journal.jsonl'
+    # Appending a record is already cheap, there's nothing to coalesce
+    supports_write_behind = False
+
+    def __init__(self, data_dir=None, settings=None):
+        """Initialize the storage and replay the journal"""
+        settings = settings or {}
+        self.journal_max_bytes = settings.get('journal_max_bytes', DEFAULT_JOURNAL_MAX_BYTES)
+        # Journal lines written when the current batch() block ends, or None
+        # when the batch outgrew the journal and ends with a compaction
+        self._batch_lines = []
+        self._batch_bytes = 0
+        super().__init__(data_dir=data_dir, settings=settings)
+
+    @property
+    def journal_file(self):
+        """Path of the journal next to the data file"""
+        return self.data_dir / self.journal_filename
+
+    def _watched_files(self):
+        """Watch the journal too, other processes append to it"""
+        return [self.data_file, self.journal_file]
+
+    def ensure_storage_exists(self):
+        """Ensure storage directory and snapshot file exist"""
+        if not self.data_dir.exists():
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+
+        if not self.data_file.exists():
+            # Create an empty snapshot without discarding an existing journal
+            super().save_data()
+
+    def load_data(self):
+        """Load the snapshot and replay the journal on top of it"""
+        super().load_data()
+
+        if not self.journal_file.exists():
+            return
+
+        try:
+            with open(self.journal_file, 'rb') as f:
+                lines = f.readlines()
+        except Exception as e:
+            raise Exception(f"Error loading journal: {str(e)}")
+
+        valid_bytes = 0
+        for line_number, line in enumerate(lines, 1):
+            if not line.endswith(b'\n'):
+                # A torn write of the last record, e.g. after a crash. Cut it
+                # off so the next record does not get appended to it.
+                self._truncate_journal(valid_bytes)
+                break
+            try:
+                record = codec.loads(line)
+            except ValueError:
+                raise Exception(f"Error loading journal: invalid record on line {line_number}")
+            self._apply(record)
+            valid_bytes += len(line)
+
+    def _truncate_journal(self, size):
+        """Truncate the journal to the given size in bytes"""
+        try:
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(size)
+        except Exception as e:
+            raise Exception(f"Error repairing journal: {str(e)}")
+
+    def save_data(self):
+        """Write a full snapshot and discard the journal it replaces"""
+        super().save_data()
+        try:
+            if self.journal_file.exists():
+                self.journal_file.unlink()
+        except Exception as e:
+            raise Exception(f"Error compacting journal: {str(e)}")
+
+    def compact(self):
+        """Fold the journal into the snapshot"""
+        self.save_data()
+
+    def _commit(self, record):
+        """Append a mutation record to the journal, compacting it when it gets too large"""
+        line = codec.dumps(record, default=json_default, compact=True) + b'\n'
+        if not self._batch_depth:
+            self._append_lines([line])
+            return
+
+        self._batch_dirty = True
+        if self._batch_lines is not None:
+            self._batch_lines.append(line)
+            self._batch_bytes += len(line)
+            if self._batch_bytes > self.journal_max_bytes:
+                # The batch ends with a compaction anyway, stop buffering it
+                self._batch_lines = None
+
+    def _append_lines(self, lines):
+        """Append journal lines, compacting the journal when it gets too large"""
+        try:
+            created = not self.journal_file.exists()
+            with open(self.journal_file, 'ab') as f:
+                f.write(b''.join(lines))
+                journal_size = f.tell()
+                if self.durability != 'none':
+                    f.flush()
+                    os.fsync(f.fileno())
+            if created and self.durability == 'dir':
+                fsync_directory(self.data_dir)
+        except Exception as e:
+            raise Exception(f"Error saving data: {str(e)}")
+
+        if journal_size > self.journal_max_bytes:
+            self.compact()
+
+    def _end_batch(self):
+        """Append the records of a batch() block as one write"""
+        try:
+            if self._batch_lines is None:
+                self.compact()
+            elif self._batch_lines:
+                self._append_lines(self._batch_lines)
+        finally:
+            self._batch_lines = []
+            self._batch_bytes = 0
+
+    def _restore(self, snapshot):
+        """Roll back the in-memory data and drop the buffered records"""
+        super()._restore(snapshot)
+        self._batch_lines = []
+        self._batch_bytes = 0
@@ -0,0 +1,222 @@
+"""
+Hour rollups for Aldo - per-day, per-week, per-month and per-year totals
+"""
+
+from datetime import date, datetime, timedelta
+
+# Rollup levels and how a date maps to the key of its period
+ROLLUP_LEVELS = {
+    'days': lambda day: day.strftime('%Y-%m-%d'),
+    'weeks': lambda day: '%d-W%02d' % day.isocalendar()[:2],
+    'months': lambda day: day.strftime('%Y-%m'),
+    'years': lambda day: day.strftime('%Y'),
+}
+
+# Days of room left after the latest date when the range-sum index is built,
+# so logging new days doesn't force a rebuild
+FENWICK_PADDING_DAYS = 366
+
+def _entry_day(entry):
+    """Get the work date of an entry dict or WorkEntry as a date object"""
+    ordinal = getattr(entry, 'ordinal', None)
+    if ordinal is not None:
+        return date.fromordinal(ordinal)
+    return datetime.strptime(entry["date"], '%Y-%m-%d').date()
+
+def _whole_period(start_date, end_date):
+    """
+    Get the rollup period a date range covers exactly
+
+    Returns:
+        (level, key) tuple for a whole ISO week, month or year, None for other ranges
+    """
+    days = (end_date - start_date).days + 1
+    if days == 7 and start_date.isoweekday() == 1:
+        return 'weeks', ROLLUP_LEVELS['weeks'](start_date)
+    next_day = end_date + timedelta(days=1)
+    if start_date.day == 1 and next_day.day == 1:
+        if days <= 31:
+            return 'months', ROLLUP_LEVELS['months'](start_date)
+        if start_date.month == 1 and next_day.month == 1 and next_day.year == start_date.year + 1:
+            return 'years', ROLLUP_LEVELS['years'](start_date)
+    return None
+
+class FenwickTree:
+    """
+    Fenwick (binary indexed) tree of hours over consecutive day ordinals
+
+    Point updates and prefix sums both take O(log n), where n is the number
+    of days covered by the tree.
+    """
+
+    def __init__(self, first_ordinal, size, day_totals=None):
+        """
+        Initialize the tree
+
+        Args:
+            first_ordinal: date.toordinal() of the first day covered
+            size: number of days covered
+            day_totals: dict of day ordinal -> hours to load (optional)
+        """
+        self.first_ordinal = first_ordinal
+        self.size = size
+        self.tree = [0.0] * (size + 1)
+
+        # Linear-time construction: place the values, then push each node's
+        # sum up to its parent
+        for ordinal, hours in (day_totals or {}).items():
+            self.tree[ordinal - first_ordinal + 1] += hours
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+
+    def covers(self, ordinal):
+        """Check whether a day ordinal is inside the tree"""
+        return self.first_ordinal <= ordinal < self.first_ordinal + self.size
+
+    def add(self, ordinal, hours):
+        """Add hours to a day covered by the tree"""
+        i = ordinal - self.first_ordinal + 1
+        while i <= self.size:
+            self.tree[i] += hours
+            i += i & -i
+
+    def prefix_sum(self, ordinal):
+        """Get the total hours of all days up to and including a day ordinal"""
+        i = min(ordinal - self.first_ordinal + 1, self.size)
+        total = 0.0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start_ordinal, end_ordinal):
+        """Get the total hours between two day ordinals (inclusive)"""
+        if end_ordinal < start_ordinal:
+            return 0.0
+        return self.prefix_sum(end_ordinal) - self.prefix_sum(start_ordinal - 1)
+
+class HourRollups:
+    """
+    Hour totals per day, ISO week, month and year
+
+    The totals are kept in a plain dict (so they can be stored next to the
+    work entries) and updated incrementally whenever an entry is logged or
+    replaced, so period totals never need the raw entries.
+    """
+
+    def __init__(self, data=None):
+        """
+        Initialize the rollups
+
+        Args:
+            data: dict of stored rollups to update in place (optional)
+        """
+        self.data = data if data is not None else {}
+        self.data.setdefault('entries', 0)
+        for level in ROLLUP_LEVELS:
+            self.data.setdefault(level, {})
+
+        # Range-sum index over the daily totals, built on the first range
+        # query and dropped when a day outside its span is logged
+        self._fenwick = None
+
+    @classmethod
+    def from_entries(cls, entries, data=None):
+        """Build the rollups from a list of work entries"""
+        rollups = cls(data)
+        for entry in entries:
+            rollups.update(entry, [])
+        return rollups
+
+    @property
+    def entry_count(self):
+        """Number of work entries the rollups were built from"""
+        return self.data['entries']
+
+    def update(self, entry, replaced):
+        """
+        Account for a logged entry and the entries it replaced
+
+        Args:
+            entry: The new work entry (or None)
+            replaced: list of work entries removed by the change
+        """
+        for old_entry in replaced:
+            self._add(_entry_day(old_entry), -old_entry["hours"])
+        self.data['entries'] -= len(replaced)
+        if entry is not None:
+            self._add(_entry_day(entry), entry["hours"])
+            self.data['entries'] += 1
+
+    def _add(self, day, hours):
+        """Add hours (possibly negative) to every period containing a date"""
+        if self._fenwick is not None:
+            if self._fenwick.covers(day.toordinal()):
+                self._fenwick.add(day.toordinal(), hours)
+            else:
+                self._fenwick = None
+        for level, period_key in ROLLUP_LEVELS.items():
+            totals = self.data[level]
+            key = period_key(day)
+            total = round(totals.get(key, 0) + hours, 6)
+            if total:
+                totals[key] = total
+            else:
+                totals.pop(key, None)
+
+    def get(self, level, key):
+        """Get the total hours of one period, e.g. get('months', '2025-05')"""
+        return self.data[level].get(key, 0)
+
+    def day_totals(self, start_date, end_date):
+        """
+        Get the total hours per day between two dates (inclusive)
+
+        Returns:
+            dict of 'YYYY-MM-DD' -> hours for days with work, in date order
+        """
+        days = self.data['days']
+        start_str, end_str = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+        if (end_date - start_date).days < len(days):
+            totals = {}
+            day = start_date
+            while day <= end_date:
+                day_str = day.strftime('%Y-%m-%d')
+                if day_str in days:
+                    totals[day_str] = days[day_str]
+                day += timedelta(days=1)
+            return totals
+
+        return {day_str: days[day_str] for day_str in sorted(days) if start_str <= day_str <= end_str}
+
+    def total(self, start_date, end_date):
+        """
+        Get the total hours between two dates (inclusive) in O(log n)
+
+        Whole ISO weeks, months and years (e.g. 'aldo summary month') are
+        read from their rollup level in O(1). Other ranges use the range-sum
+        index, (re)built from the daily totals when needed.
+        """
+        period = _whole_period(start_date, end_date)
+        if period is not None:
+            return self.get(*period)
+        if self._fenwick is None:
+            self._fenwick = self._build_fenwick()
+        if self._fenwick is None:
+            return 0
+        return round(self._fenwick.range_sum(start_date.toordinal(), end_date.toordinal()), 6)
+
+    def _build_fenwick(self):
+        """Build the range-sum index over the daily totals, or None without any"""
+        day_totals = {
+            date.fromisoformat(day_str).toordinal(): hours
+            for day_str, hours in self.data['days'].items()
+        }
+        if not day_totals:
+            return None
+        first_ordinal = min(day_totals)
+        size = max(day_totals) - first_ordinal + 1 + FENWICK_PADDING_DAYS
+        return FenwickTree(first_ordinal, size, day_totals)
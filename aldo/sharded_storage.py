@@ -0,0 +1,191 @@
+"""
+Year-sharded storage for Aldo - one data file per year, loaded on demand
+"""
+
+import copy
+from datetime import datetime
+
+from aldo.rollups import HourRollups
+from aldo.storage import WorkHoursStorage, read_json_file
+
+class ShardedWorkHoursStorage(WorkHoursStorage):
+    """
+    Splits the work entries into one file per year under shards/
+
+    A small manifest (aldo_manifest.json) holds the invoice state, the
+    hour rollups and the list of years that have a shard. Shards are only read when a query or
+    mutation touches a date in their year, and only changed shards are
+    written back on save.
+    """
+
+    data_filename = 'aldo_manifest.json'
+    shards_dirname = 'shards'
+
+    # Old years are already kept out of memory in their shards
+    supports_archive = False
+
+    def __init__(self, data_dir=None, settings=None):
+        """Initialize the storage and load the manifest"""
+        # Loaded shards by year string, and the years with unsaved changes
+        self._shards = {}
+        self._dirty_shards = set()
+        super().__init__(data_dir=data_dir, settings=settings)
+
+    @property
+    def shards_dir(self):
+        """Directory holding the per-year shard files"""
+        return self.data_dir / self.shards_dirname
+
+    @staticmethod
+    def _empty_data():
+        """Get the default manifest for an empty storage"""
+        return {
+            'last_confirmed_invoice': None,
+            'last_unconfirmed_invoice': None,
+            'confirmed_invoices': {},
+            'shards': []
+        }
+
+    def ensure_storage_exists(self):
+        """Ensure storage directories and manifest exist"""
+        if not self.shards_dir.exists():
+            self.shards_dir.mkdir(parents=True, exist_ok=True)
+
+        if not self.data_file.exists():
+            self.save_data()
+
+    def load_data(self):
+        """Load the manifest, leaving the shards to be loaded on demand"""
+        try:
+            self.aldo_data = read_json_file(self.data_file)
+        except Exception as e:
+            raise Exception(f"Error loading data: {str(e)}")
+        self._shards = {}
+        self._dirty_shards = set()
+        self._build_rollups()
+
+    def _build_rollups(self):
+        """Attach the rollups stored in the manifest, building them if missing"""
+        if not self.aldo_data.get('rollups'):
+            entries = [entry for year in self.aldo_data['shards'] for entry in self._shard(year)]
+            self.aldo_data['rollups'] = HourRollups.from_entries(entries).data
+        self._rollups = HourRollups(self.aldo_data['rollups'])
+
+    def save_data(self):
+        """Save the manifest and the shards changed since the last save"""
+        try:
+            for year in sorted(self._dirty_shards):
+                self._shards[year].compact()
+                self._write_json(self._shard_file(year), {'work_entries': self._shards[year]})
+            self._write_json(self.data_file, self.aldo_data)
+        except Exception as e:
+            raise Exception(f"Error saving data: {str(e)}")
+        self._dirty_shards = set()
+
+    def _shard_file(self, year):
+        """Path of the shard file for a year"""
+        return self.shards_dir / f'{year}.json'
+
+    def _shard(self, year):
+        """Get the entries of a year, loading its shard if needed"""
+        if year not in self._shards:
+            entries = []
+            if year in self.aldo_data['shards']:
+                try:
+                    entries = read_json_file(self._shard_file(year))['work_entries']
+                except Exception as e:
+                    raise Exception(f"Error loading data for {year}: {str(e)}")
+            self._shards[year] = self._new_entry_table(entries)
+        return self._shards[year]
+
+    def _years_between(self, start_str, end_str):
+        """Get the years with a shard that intersect a date range"""
+        return [year for year in self.aldo_data['shards'] if start_str[:4] <= year <= end_str[:4]]
+
+    def _apply_log_work(self, entry):
+        """Add a work entry to the shard of its year"""
+        year = entry["date"][:4]
+        replaced = self._shard(year).add(entry)
+        self._dirty_shards.add(year)
+        if year not in self.aldo_data['shards']:
+            self.aldo_data['shards'] = sorted(self.aldo_data['shards'] + [year])
+        return replaced
+
+    def _snapshot(self):
+        """Capture the manifest and the loaded shards"""
+        shards = {year: table.copy() for year, table in self._shards.items()}
+        return copy.deepcopy(self.aldo_data), shards, set(self._dirty_shards)
+
+    def _restore(self, snapshot):
+        """Roll the manifest and the loaded shards back to a snapshot"""
+        self.aldo_data, self._shards, self._dirty_shards = snapshot
+        self._rollups = HourRollups(self.aldo_data['rollups'])
+
+    def get_work_entries(self, start_date, end_date):
+        """Get work entries within a date range, loading only the shards it covers"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        entries = []
+        for year in self._years_between(start_str, end_str):
+            entries.extend(self._shard(year).between(start_str, end_str))
+        return entries
+
+    def iter_work_entries(self, start_date, end_date):
+        """Iterate over work entries within a date range, one shard at a time"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        for year in self._years_between(start_str, end_str):
+            yield from self._shard(year).iter_between(start_str, end_str)
+
+    def get_entries_for_date(self, date):
+        """Get the work entries logged on a single date"""
+        date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+        if date_str[:4] not in self.aldo_data['shards']:
+            return []
+        return self._shard(date_str[:4]).for_date(date_str)
+
+    def get_earliest_entry_date(self):
+        """Get the date of the earliest work entry"""
+        for year in self.aldo_data['shards']:
+            date_str = self._shard(year).first_date()
+            if date_str:
+                return datetime.strptime(date_str, '%Y-%m-%d').date()
+        return None
+
+    def get_latest_entry_date(self):
+        """Get the date of the latest work entry"""
+        for year in reversed(self.aldo_data['shards']):
+            date_str = self._shard(year).last_date()
+            if date_str:
+                return datetime.strptime(date_str, '%Y-%m-%d').date()
+        return None
+
+    def export_data(self):
+        """Export all stored data in the JSON file layout, loading every shard"""
+        aldo_data = {key: value for key, value in self.aldo_data.items() if key != 'shards'}
+        aldo_data['work_entries'] = [
+            entry for year in self.aldo_data['shards'] for entry in self._shard(year)
+        ]
+        return aldo_data
+
+    def replace_all(self, aldo_data):
+        """Replace all stored data, splitting the work entries into yearly shards"""
+        old_years = set(self.aldo_data['shards'])
+
+        self.aldo_data = self._empty_data()
+        self.aldo_data.update({key: value for key, value in aldo_data.items() if key != 'work_entries'})
+
+        entries_by_year = {}
+        for entry in aldo_data.get('work_entries', []):
+            entries_by_year.setdefault(entry["date"][:4], []).append(entry)
+        self._shards = {year: self._new_entry_table(entries) for year, entries in entries_by_year.items()}
+        self._dirty_shards = set(self._shards)
+        self.aldo_data['shards'] = sorted(self._shards)
+        self.aldo_data['rollups'] = HourRollups.from_entries(aldo_data.get('work_entries', [])).data
+        self._rollups = HourRollups(self.aldo_data['rollups'])
+        self.save_data()
+
+        # Remove shards of years that no longer have entries
+        try:
+            for year in old_years - set(self._shards):
+                self._shard_file(year).unlink()
+        except Exception as e:
+            raise Exception(f"Error saving data: {str(e)}")
@@ -0,0 +1,258 @@
+"""
+SQLite storage backend for Aldo - keeps work entries in an indexed table
+"""
+
+import copy
+import json
+import sqlite3
+from datetime import datetime
+
+from aldo.storage import WorkHoursStorage, WorkEntry
+
+# Keys of aldo_data that hold the invoice state, stored as JSON in the meta table
+META_KEYS = ('last_confirmed_invoice', 'last_unconfirmed_invoice', 'confirmed_invoices')
+
+# SQLite synchronous mode per 'storage.durability' level; the database's
+# journal already makes every transaction atomic
+SYNCHRONOUS_MODES = {'none': 'OFF', 'file': 'NORMAL', 'dir': 'FULL'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_entries (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    hours REAL NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_work_entries_date ON work_entries (date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class SQLiteWorkHoursStorage(WorkHoursStorage):
+    """
+    Stores work entries in a SQLite database with an index on the entry date
+
+    Only the invoice state is kept in aldo_data; work entries are read from
+    and written to the database row by row, so logging and range queries
+    no longer depend on the size of the history. Hour totals are summed by
+    the database over the date index instead of being kept as rollups.
+    """
+
+    data_filename = 'aldo_data.sqlite3'
+    # Every mutation is its own transaction, there's nothing to coalesce
+    supports_write_behind = False
+
+    # Queries only read the rows they need, there's nothing to archive
+    supports_archive = False
+
+    def __init__(self, data_dir=None, settings=None):
+        """Initialize the storage and open the database"""
+        self.connection = None
+        super().__init__(data_dir=data_dir, settings=settings)
+
+    @staticmethod
+    def _empty_data():
+        """Get the default invoice state for an empty database"""
+        return {
+            'last_confirmed_invoice': None,
+            'last_unconfirmed_invoice': None,
+            'confirmed_invoices': {}
+        }
+
+    def ensure_storage_exists(self):
+        """Ensure storage directory, database and schema exist"""
+        if not self.data_dir.exists():
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+
+        if self.connection is None:
+            self.connection = sqlite3.connect(str(self.data_file))
+            self.connection.row_factory = sqlite3.Row
+            self.connection.execute(f"PRAGMA synchronous = {SYNCHRONOUS_MODES[self.durability]}")
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close the database connection"""
+        super().close()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def load_data(self):
+        """Load the invoice state from the database"""
+        try:
+            rows = self.connection.execute("SELECT key, value FROM meta").fetchall()
+            for row in rows:
+                if row['key'] in META_KEYS:
+                    self.aldo_data[row['key']] = json.loads(row['value'])
+        except Exception as e:
+            raise Exception(f"Error loading data: {str(e)}")
+
+    def save_data(self):
+        """Save the invoice state to the database"""
+        try:
+            with self.connection:
+                self._write_meta()
+        except Exception as e:
+            raise Exception(f"Error saving data: {str(e)}")
+
+    def _write_meta(self):
+        """Write the invoice state to the meta table (caller handles the transaction)"""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(self.aldo_data[key])) for key in META_KEYS]
+        )
+
+    def _apply(self, record):
+        """Apply a mutation record; logged entries are written to the database, there are no rollups"""
+        if record['op'] != 'log_work':
+            return super()._apply(record)
+        with self._lock:
+            entry = record['entry'] = WorkEntry.coerce(record['entry'])
+            return self._apply_log_work(entry)
+
+    def _apply_log_work(self, entry):
+        """Replace the rows of the entry's date with it, in a transaction committed by _commit()"""
+        try:
+            if not self.connection.in_transaction:
+                # Take the write lock before reading the rows being replaced,
+                # so no other process can log the same date in between
+                self.connection.execute("BEGIN IMMEDIATE")
+            replaced = [
+                dict(row) for row in self.connection.execute(
+                    "SELECT date, hours, description, timestamp FROM work_entries WHERE date = ? ORDER BY id",
+                    (entry.date,)
+                )
+            ]
+            if replaced:
+                self.connection.execute("DELETE FROM work_entries WHERE date = ?", (entry.date,))
+            self._insert_entries([entry])
+        except Exception as e:
+            if not self._batch_depth:
+                self.connection.rollback()
+            raise Exception(f"Error saving data: {str(e)}")
+        return replaced
+
+    def _commit(self, record):
+        """Commit the transaction of a logged entry (at the end of a batch() block inside one)"""
+        if record['op'] != 'log_work':
+            super()._commit(record)
+        elif not self._batch_depth:
+            try:
+                self.connection.commit()
+            except Exception as e:
+                raise Exception(f"Error saving data: {str(e)}")
+
+    def _end_batch(self):
+        """Commit the transaction of a batch() block"""
+        with self.connection:
+            if self._batch_dirty:
+                self._write_meta()
+
+    def _snapshot(self):
+        """Capture the invoice state so a failed batch can be rolled back"""
+        return copy.deepcopy(self.aldo_data)
+
+    def _restore(self, snapshot):
+        """Roll back the open transaction and the invoice state"""
+        self.connection.rollback()
+        self.aldo_data = snapshot
+
+    def _insert_entries(self, entries):
+        """Insert work entries (caller handles the transaction)"""
+        self.connection.executemany(
+            "INSERT INTO work_entries (date, hours, description, timestamp) VALUES (?, ?, ?, ?)",
+            [
+                (entry["date"], entry["hours"], entry.get("description") or "", entry.get("timestamp", ""))
+                for entry in entries
+            ]
+        )
+
+    def get_work_entries(self, start_date, end_date):
+        """Get work entries within a date range"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        rows = self.connection.execute(
+            "SELECT date, hours, description, timestamp FROM work_entries "
+            "WHERE date BETWEEN ? AND ? ORDER BY date, id",
+            (start_str, end_str)
+        )
+        return [dict(row) for row in rows]
+
+    def iter_work_entries(self, start_date, end_date):
+        """Iterate over work entries within a date range, streaming rows from the database"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        rows = self.connection.execute(
+            "SELECT date, hours, description, timestamp FROM work_entries "
+            "WHERE date BETWEEN ? AND ? ORDER BY date, id",
+            (start_str, end_str)
+        )
+        for row in rows:
+            yield dict(row)
+
+    def get_entries_for_date(self, date):
+        """Get the work entries logged on a single date"""
+        date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+        rows = self.connection.execute(
+            "SELECT date, hours, description, timestamp FROM work_entries WHERE date = ? ORDER BY id",
+            (date_str,)
+        )
+        return [dict(row) for row in rows]
+
+    def get_daily_totals(self, start_date, end_date):
+        """Get the total hours per day within a date range, summed by the database"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        rows = self.connection.execute(
+            "SELECT date, SUM(hours) AS hours FROM work_entries "
+            "WHERE date BETWEEN ? AND ? GROUP BY date ORDER BY date",
+            (start_str, end_str)
+        )
+        return {row['date']: row['hours'] for row in rows}
+
+    def total_hours(self, start_date, end_date):
+        """Get the total hours worked within a date range, summed by the database"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        row = self.connection.execute(
+            "SELECT SUM(hours) AS hours FROM work_entries WHERE date BETWEEN ? AND ?",
+            (start_str, end_str)
+        ).fetchone()
+        return row['hours'] or 0
+
+    def get_earliest_entry_date(self):
+        """Get the date of the earliest work entry"""
+        row = self.connection.execute("SELECT MIN(date) AS date FROM work_entries").fetchone()
+        if row['date'] is None:
+            return None
+        return datetime.strptime(row['date'], '%Y-%m-%d').date()
+
+    def get_latest_entry_date(self):
+        """Get the date of the latest work entry"""
+        row = self.connection.execute("SELECT MAX(date) AS date FROM work_entries").fetchone()
+        if row['date'] is None:
+            return None
+        return datetime.strptime(row['date'], '%Y-%m-%d').date()
+
+    def export_data(self):
+        """Export all stored data in the JSON file layout"""
+        rows = self.connection.execute(
+            "SELECT date, hours, description, timestamp FROM work_entries ORDER BY date, id"
+        )
+        aldo_data = dict(self.aldo_data)
+        aldo_data['work_entries'] = [dict(row) for row in rows]
+        return aldo_data
+
+    def replace_all(self, aldo_data):
+        """Replace all stored data, e.g. when migrating from another backend"""
+        self.aldo_data = self._empty_data()
+        for key in META_KEYS:
+            if key in aldo_data:
+                self.aldo_data[key] = aldo_data[key]
+
+        try:
+            with self.connection:
+                self.connection.execute("DELETE FROM work_entries")
+                self._insert_entries(aldo_data.get('work_entries', []))
+                self._write_meta()
+        except Exception as e:
+            raise Exception(f"Error saving data: {str(e)}")
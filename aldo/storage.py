@@ -3,38 +3,574 @@ Storage management for Aldo - handles persisting and retrieving work hour data
 """
 
 import os
-import json
+import copy
+import atexit
+import threading
+from array import array
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from itertools import chain
+from math import isclose
+from operator import attrgetter
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from collections import namedtuple
 import appdirs
 
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on Windows; concurrent writers aren't serialized there
+    fcntl = None
+
+from aldo import codec
+from aldo.fileio import check_durability, write_atomic
+from aldo.rollups import HourRollups
+
 # Define the ConfirmedInvoice namedtuple
 ConfirmedInvoice = namedtuple('ConfirmedInvoice', ['invoice_number', 'start_date', 'end_date'])
 
+# Storage backends that can be selected with the 'storage.backend' config setting
+STORAGE_BACKENDS = ('json', 'journal', 'sharded', 'sqlite', 'binary')
+
+# In-memory layouts of the work entries, selected with the 'storage.layout' setting
+ENTRY_LAYOUTS = ('rows', 'columnar')
+
+# File suffix per compression of invoice archives ('storage.archive_compression')
+ARCHIVE_SUFFIXES = {'gzip': '.json.gz', 'lzma': '.json.xz'}
+
+def get_storage_class(backend):
+    """Get the storage class implementing the given backend name"""
+    if backend == 'json':
+        return WorkHoursStorage
+    if backend == 'journal':
+        from aldo.journal import JournaledWorkHoursStorage
+        return JournaledWorkHoursStorage
+    if backend == 'sharded':
+        from aldo.sharded_storage import ShardedWorkHoursStorage
+        return ShardedWorkHoursStorage
+    if backend == 'sqlite':
+        # Imported here so the sqlite3 module is only loaded when it is used
+        from aldo.sqlite_storage import SQLiteWorkHoursStorage
+        return SQLiteWorkHoursStorage
+    if backend == 'binary':
+        from aldo.binary_storage import BinaryWorkHoursStorage
+        return BinaryWorkHoursStorage
+    raise ValueError(f"Invalid storage backend: {backend}. Expected one of: {', '.join(STORAGE_BACKENDS)}")
+
+def open_storage(config=None, backend=None):
+    """
+    Create the storage selected in the configuration
+    
+    Args:
+        config: The configuration object (optional, defaults to the JSON backend)
+        backend: Override the backend named in the configuration (optional)
+    """
+    settings = config.config.get('storage', {}) if config else {}
+    backend = backend or settings.get('backend', 'json')
+    return get_storage_class(backend)(settings=settings)
+
+def _as_date(value):
+    """Convert a 'YYYY-MM-DD' string to a date object, passing dates through"""
+    if hasattr(value, 'strftime'):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def read_json_file(path):
+    """Read a JSON document from a file"""
+    return codec.load_file(path)
+
+def write_json_file(path, data, compact=False, durability='file'):
+    """Write a JSON document to a file atomically, indented unless compact is set"""
+    codec.dump_file(path, data, default=json_default, compact=compact, durability=durability)
+
+def json_default(value):
+    """Encode the objects the JSON encoders don't know, i.e. work entries and entry tables"""
+    if isinstance(value, WorkEntry):
+        return value.to_dict()
+    if isinstance(value, (EntryTable, ColumnarEntryTable)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def date_ordinal(date_str):
+    """Convert a 'YYYY-MM-DD' string to a day ordinal"""
+    # fromisoformat() parses in C, over 20x faster than strptime()
+    return date.fromisoformat(date_str).toordinal()
+
+# Keys of a work entry in the JSON data file
+WORK_ENTRY_FIELDS = ('date', 'hours', 'description', 'timestamp')
+
+class WorkEntry:
+    """
+    A logged work entry, stored compactly with its date as a day ordinal
+    
+    Entries are converted from and to the dicts of the JSON data file only
+    when reading and writing files. They support read access like those
+    dicts (entry["date"], entry.get("description")), so callers can keep
+    treating them as such.
+    """
+    
+    __slots__ = ('ordinal', 'hours', 'description', 'timestamp')
+    
+    def __init__(self, ordinal, hours, description="", timestamp=""):
+        """
+        Initialize the entry
+        
+        Args:
+            ordinal: The work date as date.toordinal()
+            hours: Number of hours worked
+            description: Description of the work performed
+            timestamp: ISO timestamp of when the entry was logged
+        """
+        self.ordinal = ordinal
+        self.hours = hours
+        self.description = description
+        self.timestamp = timestamp
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Create an entry from a dict in the JSON file layout"""
+        return cls(
+            date_ordinal(data["date"]),
+            data["hours"],
+            data.get("description") or "",
+            data.get("timestamp") or ""
+        )
+    
+    @classmethod
+    def coerce(cls, entry):
+        """Get a WorkEntry for either a WorkEntry or an entry dict"""
+        return entry if isinstance(entry, cls) else cls.from_dict(entry)
+    
+    @property
+    def date(self):
+        """The work date as a 'YYYY-MM-DD' string"""
+        return datetime.fromordinal(self.ordinal).date().isoformat()
+    
+    def to_dict(self):
+        """Convert the entry to a dict in the JSON file layout"""
+        return {
+            "date": self.date,
+            "hours": self.hours,
+            "description": self.description,
+            "timestamp": self.timestamp
+        }
+    
+    def __getitem__(self, key):
+        """Read a field like from an entry dict"""
+        if key not in WORK_ENTRY_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        """Read a field like from an entry dict, with a default"""
+        return getattr(self, key) if key in WORK_ENTRY_FIELDS else default
+    
+    def keys(self):
+        """Get the field names, like an entry dict"""
+        return WORK_ENTRY_FIELDS
+    
+    def __eq__(self, other):
+        """Compare with another entry or with an entry dict"""
+        if isinstance(other, WorkEntry):
+            return (self.ordinal, self.hours, self.description, self.timestamp) == \
+                (other.ordinal, other.hours, other.description, other.timestamp)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"WorkEntry({self.to_dict()!r})"
+
+class EntryTable:
+    """
+    Work entries kept sorted by date, with an index of the entries per date
+    
+    Range queries are two bisects plus a slice, lookups by date are a dict
+    lookup and the earliest and latest dates are the ends of the list.
+    Dates are passed as 'YYYY-MM-DD' strings and kept as day ordinals.
+    """
+    
+    def __init__(self, entries=None):
+        """
+        Initialize the table
+        
+        Args:
+            entries: list of WorkEntry objects or entry dicts in any order (optional)
+        """
+        # Stable sort, so entries sharing a date keep their logged order
+        self.entries = sorted((WorkEntry.coerce(entry) for entry in entries or []), key=attrgetter('ordinal'))
+        self.ordinals = [entry.ordinal for entry in self.entries]
+        
+        # Entry per day ordinal; a tuple of entries for days with several
+        # entries (from older versions), which keeps the common case small
+        self.by_date = {}
+        for entry in self.entries:
+            existing = self.by_date.get(entry.ordinal)
+            if existing is None:
+                self.by_date[entry.ordinal] = entry
+            else:
+                self.by_date[entry.ordinal] = (existing if isinstance(existing, tuple) else (existing,)) + (entry,)
+    
+    def __len__(self):
+        """Get the number of entries"""
+        return len(self.entries)
+    
+    def __iter__(self):
+        """Iterate over all entries in date order"""
+        return iter(self.entries)
+    
+    def copy(self):
+        """Get a copy of the table; entries are never modified in place, so they are shared"""
+        table = EntryTable.__new__(EntryTable)
+        table.entries = list(self.entries)
+        table.ordinals = list(self.ordinals)
+        table.by_date = dict(self.by_date)
+        return table
+    
+    def add(self, entry):
+        """
+        Add a work entry, replacing existing entries for the same date
+        
+        Returns:
+            list of the replaced entries
+        """
+        entry = WorkEntry.coerce(entry)
+        ordinal = entry.ordinal
+        replaced = self._for_ordinal(ordinal)
+        
+        position = bisect_left(self.ordinals, ordinal)
+        self.entries[position:position + len(replaced)] = [entry]
+        self.ordinals[position:position + len(replaced)] = [ordinal]
+        self.by_date[ordinal] = entry
+        return replaced
+    
+    def remove_between(self, start_str, end_str):
+        """
+        Remove the entries between two dates (inclusive)
+        
+        Returns:
+            list of the removed entries
+        """
+        start, end = self._range(start_str, end_str)
+        removed = self.entries[start:end]
+        del self.entries[start:end]
+        del self.ordinals[start:end]
+        for entry in removed:
+            self.by_date.pop(entry.ordinal, None)
+        return removed
+    
+    def _for_ordinal(self, ordinal):
+        """Get the list of entries logged on a day ordinal"""
+        entries = self.by_date.get(ordinal)
+        if entries is None:
+            return []
+        return list(entries) if isinstance(entries, tuple) else [entries]
+    
+    def for_date(self, date_str):
+        """Get the entries logged on a date"""
+        return self._for_ordinal(date_ordinal(date_str))
+    
+    def _range(self, start_str, end_str):
+        """Get the slice bounds of the entries between two dates (inclusive)"""
+        start = bisect_left(self.ordinals, date_ordinal(start_str))
+        end = bisect_right(self.ordinals, date_ordinal(end_str))
+        return start, end
+    
+    def between(self, start_str, end_str):
+        """Get the entries between two dates (inclusive), sorted by date"""
+        start, end = self._range(start_str, end_str)
+        return self.entries[start:end]
+    
+    def iter_between(self, start_str, end_str):
+        """Iterate over the entries between two dates (inclusive) without copying them"""
+        start, end = self._range(start_str, end_str)
+        for position in range(start, end):
+            yield self.entries[position]
+    
+    def hours_between(self, start_str, end_str):
+        """Get the total hours between two dates (inclusive)"""
+        start, end = self._range(start_str, end_str)
+        return sum(self.entries[position].hours for position in range(start, end))
+    
+    def first_date(self):
+        """Get the earliest date string, or None when empty"""
+        return self.entries[0].date if self.entries else None
+    
+    def last_date(self):
+        """Get the latest date string, or None when empty"""
+        return self.entries[-1].date if self.entries else None
+    
+    def compact(self):
+        """Release memory held for removed entries; rows own their data, so there is none"""
+
+class ColumnarEntryTable:
+    """
+    Work entries kept sorted by date in parallel typed arrays
+    
+    Date ordinals and hours live in array('i') and array('d') buffers and
+    each distinct description is stored once in a separate table, so an
+    entry costs a few machine words instead of a Python object. Lookups and
+    range queries bisect the ordinals; WorkEntry objects are only created
+    for the entries a query returns. The interface is that of EntryTable.
+    """
+    
+    def __init__(self, entries=None):
+        """
+        Initialize the table
+        
+        Args:
+            entries: list of WorkEntry objects or entry dicts in any order (optional)
+        """
+        self.ordinals = array('i')
+        self.hours = array('d')
+        self.description_ids = array('i')
+        self.timestamps = []
+        
+        # Distinct descriptions, and the position of each in that list
+        self.descriptions = []
+        self._description_ids = {}
+        
+        # Stable sort, so entries sharing a date keep their logged order
+        for entry in sorted((WorkEntry.coerce(entry) for entry in entries or []), key=attrgetter('ordinal')):
+            self.ordinals.append(entry.ordinal)
+            self.hours.append(entry.hours)
+            self.description_ids.append(self._description_id(entry.description))
+            self.timestamps.append(entry.timestamp)
+    
+    def _description_id(self, description):
+        """Get the position of a description in the description table, adding it if new"""
+        description_id = self._description_ids.get(description)
+        if description_id is None:
+            description_id = self._description_ids[description] = len(self.descriptions)
+            self.descriptions.append(description)
+        return description_id
+    
+    def _entry(self, position):
+        """Build the WorkEntry stored at a position"""
+        return WorkEntry(
+            self.ordinals[position],
+            self.hours[position],
+            self.descriptions[self.description_ids[position]],
+            self.timestamps[position]
+        )
+    
+    def __len__(self):
+        """Get the number of entries"""
+        return len(self.ordinals)
+    
+    def __iter__(self):
+        """Iterate over all entries in date order"""
+        for position in range(len(self.ordinals)):
+            yield self._entry(position)
+    
+    def copy(self):
+        """Get a copy of the table"""
+        table = ColumnarEntryTable()
+        table.ordinals = array('i', self.ordinals)
+        table.hours = array('d', self.hours)
+        table.description_ids = array('i', self.description_ids)
+        table.timestamps = list(self.timestamps)
+        table.descriptions = list(self.descriptions)
+        table._description_ids = dict(self._description_ids)
+        return table
+    
+    def add(self, entry):
+        """
+        Add a work entry, replacing existing entries for the same date
+        
+        Returns:
+            list of the replaced entries
+        """
+        entry = WorkEntry.coerce(entry)
+        start = bisect_left(self.ordinals, entry.ordinal)
+        end = bisect_right(self.ordinals, entry.ordinal, start)
+        replaced = [self._entry(position) for position in range(start, end)]
+        
+        self.ordinals[start:end] = array('i', [entry.ordinal])
+        self.hours[start:end] = array('d', [entry.hours])
+        self.description_ids[start:end] = array('i', [self._description_id(entry.description)])
+        self.timestamps[start:end] = [entry.timestamp]
+        return replaced
+    
+    def remove_between(self, start_str, end_str):
+        """
+        Remove the entries between two dates (inclusive)
+        
+        Returns:
+            list of the removed entries
+        """
+        start, end = self._range(start_str, end_str)
+        removed = [self._entry(position) for position in range(start, end)]
+        del self.ordinals[start:end]
+        del self.hours[start:end]
+        del self.description_ids[start:end]
+        del self.timestamps[start:end]
+        return removed
+    
+    def for_date(self, date_str):
+        """Get the entries logged on a date"""
+        return self.between(date_str, date_str)
+    
+    def _range(self, start_str, end_str):
+        """Get the slice bounds of the entries between two dates (inclusive)"""
+        start = bisect_left(self.ordinals, date_ordinal(start_str))
+        end = bisect_right(self.ordinals, date_ordinal(end_str))
+        return start, end
+    
+    def between(self, start_str, end_str):
+        """Get the entries between two dates (inclusive), sorted by date"""
+        return list(self.iter_between(start_str, end_str))
+    
+    def iter_between(self, start_str, end_str):
+        """Iterate over the entries between two dates (inclusive)"""
+        start, end = self._range(start_str, end_str)
+        for position in range(start, end):
+            yield self._entry(position)
+    
+    def hours_between(self, start_str, end_str):
+        """Get the total hours between two dates (inclusive) by summing a slice of the hours buffer"""
+        start, end = self._range(start_str, end_str)
+        return sum(self.hours[start:end])
+    
+    def compact(self):
+        """
+        Drop the descriptions no entry uses any more
+        
+        Descriptions of replaced and removed entries stay in the description
+        table until this is called, which storages do on every full save.
+        """
+        used = sorted(set(self.description_ids))
+        if len(used) == len(self.descriptions):
+            return
+        new_ids = {old_id: new_id for new_id, old_id in enumerate(used)}
+        self.descriptions = [self.descriptions[old_id] for old_id in used]
+        self._description_ids = {description: new_id for new_id, description in enumerate(self.descriptions)}
+        self.description_ids = array('i', (new_ids[old_id] for old_id in self.description_ids))
+    
+    def first_date(self):
+        """Get the earliest date string, or None when empty"""
+        return datetime.fromordinal(self.ordinals[0]).date().isoformat() if self.ordinals else None
+    
+    def last_date(self):
+        """Get the latest date string, or None when empty"""
+        return datetime.fromordinal(self.ordinals[-1]).date().isoformat() if self.ordinals else None
+
+def new_entry_table(layout, entries=None):
+    """
+    Create an entry table with the given in-memory layout
+    
+    Args:
+        layout: One of ENTRY_LAYOUTS
+        entries: list of WorkEntry objects or entry dicts in any order (optional)
+    """
+    if layout == 'rows':
+        return EntryTable(entries)
+    if layout == 'columnar':
+        return ColumnarEntryTable(entries)
+    raise ValueError(f"Invalid storage layout: {layout}. Expected one of: {', '.join(ENTRY_LAYOUTS)}")
+
 class WorkHoursStorage:
     """Manages the storage of work hours data and invoice tracking"""
     
-    def __init__(self):
-        """Initialize the storage with default paths"""
+    # Name of the file holding the data inside the data directory
+    data_filename = 'aldo_data.json'
+    
+    # Name of the file locked while a process reads, changes and saves the data
+    lock_filename = 'aldo_data.lock'
+    
+    # Directory of the compressed archives of confirmed invoices' entries
+    archive_dirname = 'archive'
+    
+    # Whether entries of confirmed invoices can be moved to archives with the
+    # 'storage.archive_confirmed' setting; backends that never parse their
+    # whole history turn it off
+    supports_archive = True
+    
+    # Whether mutations can be coalesced by the 'storage.write_behind_delay'
+    # setting; backends persisting each mutation on their own turn it off
+    supports_write_behind = True
+    
+    def __init__(self, data_dir=None, settings=None):
+        """
+        Initialize the storage with default paths
+        
+        Args:
+            data_dir: Directory holding the data files (optional, defaults to the user data dir)
+            settings: The 'storage' section of the configuration (optional)
+        """
         # Use appdirs to get standard data locations
-        self.data_dir = Path(appdirs.user_data_dir("aldo", "aldo"))
-        self.data_file = self.data_dir / 'aldo_data.json'
+        self.data_dir = Path(data_dir) if data_dir else Path(appdirs.user_data_dir("aldo", "aldo"))
+        self.data_file = self.data_dir / self.data_filename
+        self.settings = settings or {}
+        self.layout = self.settings.get('layout', 'rows')
+        # Write the data files without indentation ('storage.compact_json')
+        self.compact_json = self.settings.get('compact_json', False)
+        # Whether saves fsync the data files and their directory ('storage.durability')
+        self.durability = check_durability(self.settings.get('durability', 'file'))
 
         # Initialize with default structure
-        self.aldo_data = {
+        self.aldo_data = self._empty_data()
+        
+        # Sorted and indexed work entries, kept out of aldo_data and written
+        # as its 'work_entries' list on save, so queries don't scan them
+        self._entries = self._new_entry_table()
+        
+        # Hour totals per day, week, month and year, stored with the entries
+        # in aldo_data['rollups'] and updated on every log_work(). They keep
+        # counting the hours of archived entries.
+        self._rollups = HourRollups()
+        
+        # Entries of the invoice archives read so far, by invoice number
+        self._archives = {}
+        
+        # Nesting depth of batch() blocks and whether they changed anything
+        self._batch_depth = 0
+        self._batch_dirty = False
+        
+        # Whether there are changes that haven't been saved yet, and their
+        # mutation records, applied again if another process saves first
+        self._dirty = False
+        self._unsaved_records = []
+        
+        # Write-behind mode: seconds to wait before saving a mutation, so
+        # that mutations in the meantime are saved with it. The lock keeps
+        # the flush thread from saving while the data is being changed.
+        self.write_behind_delay = self.settings.get('write_behind_delay') if self.supports_write_behind else None
+        self._lock = threading.RLock()
+        self._flush_timer = None
+        if self.write_behind_delay:
+            atexit.register(self.close)
+        
+        # Nesting depth of _file_lock() blocks, the descriptor holding the
+        # lock and whether it is shared, and the (inode, mtime, size) of the
+        # data files when this process last read or wrote them
+        self._file_lock_depth = 0
+        self._file_lock_fd = None
+        self._file_lock_shared = False
+        self._file_signature = None
+        
+        # Loading only needs the shared lock, creating the data files the
+        # exclusive one
+        with self._file_lock(refresh=False, shared=self.data_file.exists()):
+            # Ensure storage exists and load data
+            self.ensure_storage_exists()
+            
+            # Load data if it exists
+            if self.data_file.exists():
+                self.load_data()
+    
+    @staticmethod
+    def _empty_data():
+        """Get the default data structure for an empty storage"""
+        return {
             'last_confirmed_invoice': None,
             'last_unconfirmed_invoice': None,
-            'confirmed_invoices': {},
-            'work_entries': []
+            'confirmed_invoices': {}
         }
-        
-        # Ensure storage exists and load data
-        self.ensure_storage_exists()
-        
-        # Load data if it exists
-        if self.data_file.exists():
-            self.load_data()
     
     def ensure_storage_exists(self):
         """Ensure storage directory and file exist"""
@@ -48,53 +584,525 @@ class WorkHoursStorage:
     def load_data(self):
         """Load data from file"""
         try:
-            with open(self.data_file, 'r') as f:
-                self.aldo_data = json.load(f)
+            self.aldo_data = read_json_file(self.data_file)
         except Exception as e:
             raise Exception(f"Error loading data: {str(e)}")
+        self._build_indexes()
+    
+    def _new_entry_table(self, entries=None):
+        """Create an entry table in the layout selected by the 'storage.layout' setting"""
+        return new_entry_table(self.layout, entries)
+    
+    def _build_indexes(self):
+        """Sort and index the loaded work entries and attach their rollups"""
+        self._entries = self._new_entry_table(self.aldo_data.pop("work_entries", []))
+        self._archives = {}
+        
+        # Trust the stored rollups only if they count the same entries and
+        # hours as the data; edits that didn't update them (by hand or by an
+        # older aldo) make them rebuild
+        archived = self._archived_invoices()
+        rollups = self.aldo_data.get('rollups')
+        if not self._rollups_match(rollups, archived):
+            entries = chain(self._entries, *(self._archived_entries(invoice) for invoice in archived))
+            rollups = HourRollups.from_entries(entries).data
+            self.aldo_data['rollups'] = rollups
+        self._rollups = HourRollups(rollups)
+    
+    def _rollups_match(self, rollups, archived):
+        """
+        Check stored rollups against the loaded entries in O(n) additions
+        
+        Archived periods can't change, so their days are left out of the
+        hours check instead of reading the archives.
+        """
+        if not rollups or 'days' not in rollups:
+            return False
+        archived_count = sum(invoice['archive']['entries'] for invoice in archived)
+        if rollups.get('entries') != len(self._entries) + archived_count:
+            return False
+        
+        days = rollups['days']
+        stored_hours = sum(days.values())
+        if archived:
+            stored_hours -= sum(self._archived_day_totals(days, archived).values())
+        entry_hours = self._entries.hours_between('0001-01-01', '9999-12-31')
+        return isclose(stored_hours, entry_hours, rel_tol=1e-9, abs_tol=1e-6)
+    
+    @staticmethod
+    def _archived_day_totals(day_totals, archived):
+        """Get the daily totals of the days inside the periods of archived invoices"""
+        periods = sorted((invoice['start_date'], invoice['end_date']) for invoice in archived)
+        starts = [start for start, _ in periods]
+        totals = {}
+        for day_str, hours in day_totals.items():
+            position = bisect_right(starts, day_str) - 1
+            if position >= 0 and day_str <= periods[position][1]:
+                totals[day_str] = hours
+        return totals
+    
+    def _file_data(self):
+        """Get the data in the layout of the data file, with the entries in date order"""
+        return dict(self.aldo_data, work_entries=self._entries)
+    
+    def _write_json(self, path, data):
+        """Write a data file with the 'compact_json' and 'durability' settings"""
+        write_json_file(path, data, compact=self.compact_json, durability=self.durability)
     
     def save_data(self):
         """Save data to file"""
+        self._entries.compact()
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(self.aldo_data, f, indent=2)
+            self._write_json(self.data_file, self._file_data())
         except Exception as e:
             raise Exception(f"Error saving data: {str(e)}")
     
+    def _watched_files(self):
+        """Get the files whose changes by other processes require a reload"""
+        return [self.data_file]
+    
+    def _signature(self):
+        """Get the (inode, mtime, size) of each watched file, None for missing files"""
+        signature = []
+        for path in self._watched_files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+    
+    def refresh(self):
+        """
+        Reload the data if another process changed the data files
+        
+        Only the file metadata is compared, so this is cheap when nothing
+        changed. Unsaved changes (in write-behind mode) are never discarded:
+        their mutation records are applied again to the reloaded data.
+        
+        Returns:
+            bool: True if the data was reloaded
+        """
+        with self._lock, self._file_lock(refresh=False, shared=True):
+            signature = self._signature()
+            if signature == self._file_signature:
+                return False
+            self.load_data()
+            for record in self._unsaved_records:
+                self._apply(record)
+            self._file_signature = signature
+            return True
+    
+    @contextmanager
+    def _file_lock(self, refresh=True, shared=False):
+        """
+        Hold the advisory lock of the data directory for a read-modify-write
+        
+        Other processes using the same data directory wait until the block
+        ends. On entering the outermost block the data is reloaded if another
+        process changed it, so mutations never apply to stale data and saves
+        never overwrite another process's changes. Nested blocks join the
+        outermost one.
+        
+        Blocks that only read the data files pass shared=True, so they don't
+        wait for each other, only for writers. An exclusive block nested in a
+        shared one (outside of batch() blocks, whose mutations are only saved
+        when they end) upgrades the lock for its duration and reloads the
+        data, as other processes may have saved while the lock was upgraded.
+        """
+        with self._lock:
+            if self._file_lock_depth:
+                upgrade = self._file_lock_shared and not shared and not self._batch_depth
+                if upgrade:
+                    self._flock(exclusive=True)
+                self._file_lock_depth += 1
+                try:
+                    if upgrade and refresh:
+                        self.refresh()
+                    yield
+                finally:
+                    self._file_lock_depth -= 1
+                    if upgrade:
+                        self._file_signature = self._signature()
+                        self._flock(exclusive=False)
+                return
+            
+            if not self.data_dir.exists():
+                self.data_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                self._file_lock_fd = os.open(self.data_dir / self.lock_filename, os.O_RDWR | os.O_CREAT, 0o644)
+            except Exception as e:
+                raise Exception(f"Error locking data: {str(e)}")
+            
+            try:
+                self._flock(exclusive=not shared)
+                self._file_lock_depth = 1
+                if refresh:
+                    self.refresh()
+                yield
+            finally:
+                self._file_lock_depth = 0
+                # Our own saves must not look like changes of another process
+                self._file_signature = self._signature()
+                # Closing the descriptor releases the lock
+                os.close(self._file_lock_fd)
+                self._file_lock_fd = None
+    
+    def _flock(self, exclusive):
+        """Take the lock held by _file_lock() in exclusive or shared mode, converting the held one"""
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file_lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            except Exception as e:
+                raise Exception(f"Error locking data: {str(e)}")
+        self._file_lock_shared = not exclusive
+    
     def log_work(self, date, hours, description=""):
         """Log work hours for a specific date"""
-        # Convert date to string for JSON storage
         date_str = date.strftime('%Y-%m-%d')
         
-        # Check if there's an existing entry for this date
-        # If so, we'll remove it before adding the new one
-        existing_entries = [
-            i for i, entry in enumerate(self.aldo_data["work_entries"])
-            if entry["date"] == date_str
-        ]
+        # Create new entry
+        entry = WorkEntry(date.toordinal(), hours, description or "", datetime.now().isoformat())
         
-        # If entry exists for this date, remove it and notify
-        if existing_entries:
-            for index in sorted(existing_entries, reverse=True):
-                old_entry = self.aldo_data["work_entries"][index]
-                del self.aldo_data["work_entries"][index]
+        # Add to entries, replacing any previous entry for this date, and save
+        record = {'op': 'log_work', 'entry': entry}
+        with self._file_lock():
+            archived = self._archived_invoices(date_str, date_str)
+            if archived:
+                raise ValueError(f"{date_str} is billed by confirmed invoice #{archived[0]['invoice_number']}, "
+                                 "whose entries are archived")
+            for old_entry in self._apply(record):
                 print(f"Replaced previous entry: {old_entry['hours']} hours on {date_str}")
+            self._commit(record)
+        return entry
+    
+    def _apply(self, record):
+        """
+        Apply a mutation record to the in-memory data
         
-        # Create new entry
-        entry = {
-            "date": date_str,
-            "hours": hours,
-            "description": description,
-            "timestamp": datetime.now().isoformat()
+        Every change to the data is described by a record, so that backends
+        can persist the record itself instead of the whole data set.
+        
+        Args:
+            record: dict with an 'op' key and the data of the mutation
+            
+        Returns:
+            list of work entries replaced by the mutation
+        """
+        op = record['op']
+        with self._lock:
+            if op == 'log_work':
+                # Records replayed from a journal hold entry dicts
+                entry = record['entry'] = WorkEntry.coerce(record['entry'])
+                if self._archived_invoices(entry.date, entry.date):
+                    # A journal record replayed over a snapshot that has
+                    # archived the entry since; log_work() refuses such dates
+                    return []
+                replaced = self._apply_log_work(entry)
+                self._rollups.update(entry, replaced)
+                return replaced
+            elif op == 'store_unconfirmed_invoice':
+                self.aldo_data['last_unconfirmed_invoice'] = record['invoice']
+            elif op == 'confirm_invoice':
+                invoice = record['invoice']
+                self.aldo_data['confirmed_invoices'][invoice['invoice_number']] = invoice
+                self.aldo_data['last_confirmed_invoice'] = invoice
+                self.aldo_data['last_unconfirmed_invoice'] = None
+            elif op == 'archive_invoice':
+                # The archive file was written before the record; the hours
+                # stay in the rollups
+                invoice = self.aldo_data['confirmed_invoices'][record['invoice_number']]
+                self._entries.remove_between(invoice['start_date'], invoice['end_date'])
+                invoice['archive'] = record['archive']
+            else:
+                raise ValueError(f"Invalid storage operation: {op}")
+        return []
+    
+    def _apply_log_work(self, entry):
+        """Add a work entry, removing existing entries for the same date"""
+        return self._entries.add(entry)
+    
+    def _commit(self, record):
+        """Persist a mutation record that has been applied to the in-memory data"""
+        self._dirty = True
+        self._unsaved_records.append(record)
+        if self._batch_depth:
+            # Saved once when the outermost batch() block ends
+            self._batch_dirty = True
+        else:
+            self._persist()
+    
+    def _persist(self):
+        """Save the unsaved changes now, or schedule saving them in write-behind mode"""
+        if not self.write_behind_delay:
+            self.flush()
+            return
+        with self._lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.write_behind_delay, self._timed_flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _timed_flush(self):
+        """Save the changes coalesced since the write-behind timer was started"""
+        with self._lock:
+            self._flush_timer = None
+            self.flush()
+    
+    def flush(self):
+        """Save the unsaved changes, if there are any"""
+        with self._lock:
+            if not self._dirty or self._batch_depth:
+                return
+            # Entering the lock reloads the data if another process saved
+            # since, with the unsaved changes applied on top
+            with self._file_lock():
+                self.save_data()
+                self._dirty = False
+                self._unsaved_records = []
+    
+    def close(self):
+        """Save the unsaved changes and stop the write-behind timer"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self.flush()
+        if self.write_behind_delay:
+            atexit.unregister(self.close)
+    
+    def log_many(self, entries):
+        """
+        Log work hours for several dates with a single save
+        
+        Args:
+            entries: iterable of (date, hours, description) tuples, consumed lazily
+            
+        Returns:
+            int: the number of entries logged
+        """
+        count = 0
+        with self.batch():
+            for date, hours, description in entries:
+                self.log_work(date, hours, description)
+                count += 1
+        return count
+    
+    @contextmanager
+    def batch(self):
+        """
+        Defer persisting mutations until the end of the block
+        
+        All mutations made inside the block are saved once when it ends. If
+        the block raises, the in-memory data is rolled back to its state at
+        the start of the block and nothing is saved. Nested blocks join the
+        outermost one.
+        
+        Backends that keep unsaved mutations as records (those supporting
+        write-behind) only hold the shared lock during the block, so other
+        processes can read and save meanwhile, and take the exclusive lock to
+        save on top of their changes. The others hold the exclusive lock
+        throughout.
+        """
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+        
+        with self._file_lock(shared=self.supports_write_behind):
+            snapshot = self._snapshot()
+            unsaved = len(self._unsaved_records)
+            self._batch_depth = 1
+            self._batch_dirty = False
+            try:
+                yield self
+                self._batch_depth = 0
+                self._end_batch()
+            except BaseException:
+                self._batch_depth = 0
+                self._restore(snapshot)
+                del self._unsaved_records[unsaved:]
+                raise
+            finally:
+                self._batch_dirty = False
+    
+    def _end_batch(self):
+        """Persist the mutations made in a batch() block"""
+        if self._batch_dirty:
+            self._persist()
+    
+    def _snapshot(self):
+        """Capture the in-memory data so a failed batch can be rolled back"""
+        return copy.deepcopy(self.aldo_data), self._entries.copy()
+    
+    def _restore(self, snapshot):
+        """Roll the in-memory data back to a snapshot"""
+        self.aldo_data, self._entries = snapshot
+        self._rollups = HourRollups(self.aldo_data['rollups'])
+    
+    def export_data(self):
+        """
+        Export all stored data in the JSON file layout
+        
+        Archived entries are included, and the invoices no longer refer to
+        their archives, so the export stands on its own.
+        
+        Returns:
+            dict with the invoice state and the full list of work entries
+        """
+        entries = self._with_archived(self._entries, '0001-01-01', '9999-12-31')
+        aldo_data = dict(self.aldo_data, work_entries=list(entries))
+        aldo_data['confirmed_invoices'] = {
+            number: {key: value for key, value in invoice.items() if key != 'archive'}
+            for number, invoice in self.aldo_data['confirmed_invoices'].items()
         }
+        if aldo_data.get('last_confirmed_invoice'):
+            aldo_data['last_confirmed_invoice'] = {
+                key: value for key, value in aldo_data['last_confirmed_invoice'].items() if key != 'archive'
+            }
+        return aldo_data
+    
+    @property
+    def archive_dir(self):
+        """Directory holding the invoice archives"""
+        return self.data_dir / self.archive_dirname
+    
+    def archive_confirmed_invoices(self):
+        """
+        Move the entries of confirmed invoices to compressed archive files
         
-        # Add to entries and save
-        self.aldo_data["work_entries"].append(entry)
-        self.save_data()
-        return entry
+        Each confirmed invoice that isn't archived yet gets a gzip (or lzma,
+        see 'storage.archive_compression') file under archive/ holding the
+        entries of its period, which are then dropped from the data file.
+        Archives are read only when a query covers their period; the hour
+        rollups keep counting the archived hours. Dates in archived periods
+        can no longer be logged.
+        
+        Returns:
+            int: the number of invoices archived
+        """
+        if not self.supports_archive:
+            raise ValueError(f"The {type(self).__name__} backend doesn't archive entries")
+        
+        count = 0
+        with self._file_lock():
+            invoices = sorted(self.aldo_data['confirmed_invoices'].values(),
+                              key=lambda invoice: int(invoice['invoice_number']))
+            for invoice in invoices:
+                if 'archive' in invoice:
+                    continue
+                entries = self._entries.between(invoice['start_date'], invoice['end_date'])
+                record = {
+                    'op': 'archive_invoice',
+                    'invoice_number': invoice['invoice_number'],
+                    'archive': self._write_archive(invoice['invoice_number'], entries)
+                }
+                self._apply(record)
+                self._commit(record)
+                count += 1
+        return count
     
-    def get_work_entries(self, start_date, end_date):
-        """Get work entries within a date range"""
+    def _write_archive(self, invoice_number, entries):
+        """
+        Write the entries of an invoice to a compressed archive file
+        
+        Returns:
+            dict describing the archive, stored with the invoice
+        """
+        compression = self.settings.get('archive_compression', 'gzip')
+        if compression not in ARCHIVE_SUFFIXES:
+            raise ValueError(f"Invalid archive compression: {compression}. Expected one of: {', '.join(ARCHIVE_SUFFIXES)}")
+        path = self.archive_dir / f'invoice-{invoice_number}{ARCHIVE_SUFFIXES[compression]}'
+        
+        data = codec.dumps({'work_entries': entries}, default=json_default, compact=True)
+        try:
+            # Imported here, as they are only needed for archives
+            if compression == 'gzip':
+                import gzip
+                data = gzip.compress(data)
+            else:
+                import lzma
+                data = lzma.compress(data)
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            write_atomic(path, data, self.durability)
+        except Exception as e:
+            raise Exception(f"Error archiving invoice #{invoice_number}: {str(e)}")
+        
+        return {
+            'file': path.relative_to(self.data_dir).as_posix(),
+            'entries': len(entries),
+            'first_date': entries[0]['date'] if entries else None,
+            'last_date': entries[-1]['date'] if entries else None
+        }
+    
+    def _archived_invoices(self, start_str='0001-01-01', end_str='9999-12-31'):
+        """Get the archived invoices whose period intersects a date range"""
+        return [
+            invoice for invoice in self.aldo_data['confirmed_invoices'].values()
+            if 'archive' in invoice and invoice['start_date'] <= end_str and start_str <= invoice['end_date']
+        ]
+    
+    def _archived_entries(self, invoice):
+        """Get the entries of an archived invoice, reading its archive on first use"""
+        invoice_number = invoice['invoice_number']
+        if invoice_number not in self._archives:
+            path = self.data_dir / invoice['archive']['file']
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if path.name.endswith(ARCHIVE_SUFFIXES['lzma']):
+                    import lzma
+                    data = lzma.decompress(data)
+                else:
+                    import gzip
+                    data = gzip.decompress(data)
+                entries = codec.loads(data)['work_entries']
+            except Exception as e:
+                raise Exception(f"Error loading archive of invoice #{invoice_number}: {str(e)}")
+            self._archives[invoice_number] = [WorkEntry.from_dict(entry) for entry in entries]
+        return self._archives[invoice_number]
+    
+    def _with_archived(self, entries, start_str, end_str):
+        """
+        Merge the archived entries between two dates into entries of the data file
+        
+        Args:
+            entries: iterable of the data file's entries in the range, in date order
+            
+        Returns:
+            iterator over all entries in the range, in date order
+        """
+        archived = self._archived_invoices(start_str, end_str)
+        if not archived:
+            return iter(entries)
+        start_ordinal, end_ordinal = date_ordinal(start_str), date_ordinal(end_str)
+        ranges = [
+            (entry for entry in self._archived_entries(invoice) if start_ordinal <= entry.ordinal <= end_ordinal)
+            for invoice in archived
+        ]
+        return merge(entries, *ranges, key=attrgetter('ordinal'))
+    
+    def replace_all(self, aldo_data):
+        """
+        Replace all stored data, e.g. when migrating from another backend
+        
+        Args:
+            aldo_data: dict in the layout returned by export_data()
+        """
+        with self._file_lock(refresh=False):
+            self.aldo_data = self._empty_data()
+            self.aldo_data.update(aldo_data)
+            self._build_indexes()
+            self.save_data()
+            self._dirty = False
+            self._unsaved_records = []
+    
+    def _date_range_strings(self, start_date, end_date):
+        """Convert the bounds of a date range to 'YYYY-MM-DD' strings"""
         # Convert dates to strings for comparison, handling different input types
         if hasattr(start_date, 'strftime'):
             start_str = start_date.strftime('%Y-%m-%d')
@@ -113,17 +1121,54 @@ class WorkHoursStorage:
             # Default to today if we can't determine
             end_str = datetime.now().strftime('%Y-%m-%d')
         
-        # Filter entries by date range
-        filtered_entries = [
-            entry for entry in self.aldo_data["work_entries"]
-            if start_str <= entry["date"] <= end_str
-        ]
+        return start_str, end_str
+    
+    def get_work_entries(self, start_date, end_date):
+        """Get work entries within a date range"""
+        start_str, end_str = self._date_range_strings(start_date, end_date)
         
-        # Sort by date
-        return sorted(filtered_entries, key=lambda x: x["date"])
+        # Entries are kept sorted by date, so this is a slice
+        entries = self._entries.between(start_str, end_str)
+        if self._archived_invoices(start_str, end_str):
+            entries = list(self._with_archived(entries, start_str, end_str))
+        return entries
     
-    def get_summary(self, period):
-        """Get summary of work hours for the specified period"""
+    def iter_work_entries(self, start_date, end_date):
+        """
+        Iterate over work entries within a date range in date order
+        
+        Unlike get_work_entries() no list of the entries is built, which
+        keeps exports of long histories in constant memory.
+        """
+        start_str, end_str = self._date_range_strings(start_date, end_date)
+        return self._with_archived(self._entries.iter_between(start_str, end_str), start_str, end_str)
+    
+    def get_entries_for_date(self, date):
+        """
+        Get the work entries logged on a single date
+        
+        Args:
+            date: The date as a date object or 'YYYY-MM-DD' string
+            
+        Returns:
+            list of work entries (usually at most one)
+        """
+        date_str = date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else str(date)
+        entries = self._entries.for_date(date_str)
+        if self._archived_invoices(date_str, date_str):
+            entries = list(self._with_archived(entries, date_str, date_str))
+        return entries
+    
+    def get_period_range(self, period):
+        """
+        Get the date range covered by a summary period
+        
+        Args:
+            period: One of 'week', 'month' or 'year'
+            
+        Returns:
+            (start_date, end_date) tuple of date objects
+        """
         today = datetime.now().date()
         
         # Determine date range based on period
@@ -143,36 +1188,63 @@ class WorkHoursStorage:
         else:
             raise ValueError(f"Invalid period: {period}")
         
-        # Get entries in date range
-        entries = self.get_work_entries(start_date, end_date)
+        return start_date, end_date
+    
+    def get_summary(self, period):
+        """Get summary of work hours for the specified period"""
+        start_date, end_date = self.get_period_range(period)
         
-        # Group by date
+        # Group entries by date, looking up each day of the period
         summary = {}
-        for entry in entries:
-            date = entry["date"]
-            if date not in summary:
-                summary[date] = []
-            summary[date].append({
-                "hours": entry["hours"],
-                "description": entry["description"]
-            })
+        day = start_date
+        while day <= end_date:
+            entries = self.get_entries_for_date(day)
+            if entries:
+                summary[day.strftime('%Y-%m-%d')] = [
+                    {"hours": entry["hours"], "description": entry["description"]}
+                    for entry in entries
+                ]
+            day += timedelta(days=1)
         
         return summary
     
+    def get_daily_totals(self, start_date, end_date):
+        """
+        Get the total hours per day within a date range, from the rollups
+        
+        Returns:
+            dict of 'YYYY-MM-DD' -> hours for days with work, in date order
+        """
+        return self._rollups.day_totals(_as_date(start_date), _as_date(end_date))
+    
+    def total_hours(self, start_date, end_date):
+        """Get the total hours worked within a date range in O(log n), from the rollups' range-sum index"""
+        return self._rollups.total(_as_date(start_date), _as_date(end_date))
+    
     def get_total_hours(self, entries):
         """Calculate total hours from a list of work entries"""
         return sum(entry["hours"] for entry in entries)
         
     def get_earliest_entry_date(self):
         """Get the date of the earliest work entry"""
-        if not self.aldo_data["work_entries"]:
+        date_strs = [self._entries.first_date()] + [
+            invoice['archive']['first_date'] for invoice in self._archived_invoices()
+        ]
+        date_str = min((date_str for date_str in date_strs if date_str), default=None)
+        if date_str is None:
             return None
         
-        # Find the earliest date in the entries
-        earliest_entry = min(self.aldo_data["work_entries"], key=lambda x: x["date"])
-        
         # Convert the string date to a date object
-        date_str = earliest_entry["date"]
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    
+    def get_latest_entry_date(self):
+        """Get the date of the latest work entry"""
+        date_strs = [self._entries.last_date()] + [
+            invoice['archive']['last_date'] for invoice in self._archived_invoices()
+        ]
+        date_str = max((date_str for date_str in date_strs if date_str), default=None)
+        if date_str is None:
+            return None
         return datetime.strptime(date_str, '%Y-%m-%d').date()
 
     def get_next_invoice_number(self):
@@ -208,12 +1280,20 @@ class WorkHoursStorage:
         start_date_str = start_date.strftime('%Y-%m-%d') if hasattr(start_date, 'strftime') else str(start_date)
         end_date_str = end_date.strftime('%Y-%m-%d') if hasattr(end_date, 'strftime') else str(end_date)
         
-        self.aldo_data['last_unconfirmed_invoice'] = {
-            'invoice_number': numeric_part,
-            'start_date': start_date_str,
-            'end_date': end_date_str
+        record = {
+            'op': 'store_unconfirmed_invoice',
+            'invoice': {
+                'invoice_number': numeric_part,
+                'start_date': start_date_str,
+                'end_date': end_date_str
+            }
         }
-        self.save_data()
+        with self._file_lock():
+            # Regenerating the same invoice changes nothing, so skip the save
+            if self.aldo_data.get('last_unconfirmed_invoice') == record['invoice']:
+                return
+            self._apply(record)
+            self._commit(record)
     
     def get_last_unconfirmed_invoice(self):
         """
@@ -243,48 +1323,48 @@ class WorkHoursStorage:
         Returns:
             bool: True if confirmation was successful, False otherwise
         """
-        # Check if there's an unconfirmed invoice to confirm
-        unconfirmed = self.aldo_data.get('last_unconfirmed_invoice')
-        if not unconfirmed:
-            raise Exception("No unconfirmed invoice found. Generate an invoice first before confirming.")
-        
-        # Extract the numeric part if the full invoice ID was provided
-        prefix = config.config['invoice']['prefix']
-        if isinstance(invoice_number, str) and invoice_number.startswith(prefix):
-            invoice_number = int(invoice_number[len(prefix):])
-        else:
-            try:
-                invoice_number = int(invoice_number)
-            except (ValueError, TypeError):
-                return False
-        
-        # Check if the invoice number matches the unconfirmed invoice
-        if str(invoice_number) != unconfirmed['invoice_number']:
-            raise Exception(f"Invoice number mismatch. Expected {unconfirmed['invoice_number']}, got {invoice_number}")
-        
-        # Format as string for storage
-        invoice_id = str(invoice_number)
-        
-        # Create the confirmed invoice using the unconfirmed invoice data
-        confirmed_invoice_data = {
-            'invoice_number': invoice_id,
-            'start_date': unconfirmed['start_date'],
-            'end_date': unconfirmed['end_date']
-        }
-        
-        # Store the invoice confirmation
-        self.aldo_data['confirmed_invoices'][invoice_id] = confirmed_invoice_data
-        
-        # Update the last confirmed invoice
-        self.aldo_data['last_confirmed_invoice'] = confirmed_invoice_data
-        
-        # Clear the unconfirmed invoice
-        self.aldo_data['last_unconfirmed_invoice'] = None
-        
-        # Save changes
-        self.save_data()
-        
-        return True
+        with self._file_lock():
+            # Check if there's an unconfirmed invoice to confirm
+            unconfirmed = self.aldo_data.get('last_unconfirmed_invoice')
+            if not unconfirmed:
+                raise Exception("No unconfirmed invoice found. Generate an invoice first before confirming.")
+            
+            # Extract the numeric part if the full invoice ID was provided
+            prefix = config.config['invoice']['prefix']
+            if isinstance(invoice_number, str) and invoice_number.startswith(prefix):
+                invoice_number = int(invoice_number[len(prefix):])
+            else:
+                try:
+                    invoice_number = int(invoice_number)
+                except (ValueError, TypeError):
+                    return False
+            
+            # Check if the invoice number matches the unconfirmed invoice
+            if str(invoice_number) != unconfirmed['invoice_number']:
+                raise Exception(f"Invoice number mismatch. Expected {unconfirmed['invoice_number']}, got {invoice_number}")
+            
+            # Format as string for storage
+            invoice_id = str(invoice_number)
+            
+            # Create the confirmed invoice using the unconfirmed invoice data
+            confirmed_invoice_data = {
+                'invoice_number': invoice_id,
+                'start_date': unconfirmed['start_date'],
+                'end_date': unconfirmed['end_date']
+            }
+            
+            # Store the invoice confirmation, update the last confirmed invoice
+            # and clear the unconfirmed invoice
+            record = {'op': 'confirm_invoice', 'invoice': confirmed_invoice_data}
+            self._apply(record)
+            
+            # Save changes
+            self._commit(record)
+            
+            if self.supports_archive and self.settings.get('archive_confirmed'):
+                self.archive_confirmed_invoices()
+            
+            return True
     
     def get_last_confirmed_invoice(self):
         """
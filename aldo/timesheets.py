@@ -0,0 +1,144 @@
+"""
+Timesheet import and export for Aldo - validates dates and hours and streams timesheet files
+"""
+
+import csv
+import json
+from datetime import datetime, timedelta
+
+# Timesheet formats understood by read_timesheet() and write_timesheet()
+TIMESHEET_FORMATS = ('csv', 'jsonl')
+
+# Columns written by write_timesheet()
+TIMESHEET_FIELDS = ('date', 'hours', 'description', 'timestamp')
+
+def parse_date(value):
+    """
+    Parse a date in YYYY-MM-DD format or one of the date aliases
+
+    Args:
+        value: 'YYYY-MM-DD' or one of: today, yesterday, tomorrow, daybefore
+
+    Returns:
+        date object
+
+    Raises:
+        ValueError: if the value is not a valid date
+    """
+    # Handle date aliases
+    today = datetime.now().date()
+    if value == "today":
+        return today
+    elif value == "yesterday":
+        return today - timedelta(days=1)
+    elif value == "tomorrow":
+        return today + timedelta(days=1)
+    elif value == "daybefore":
+        return today - timedelta(days=2)
+
+    # Handle regular date format
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        raise ValueError('Date must be in YYYY-MM-DD format or one of: today, yesterday, tomorrow, daybefore')
+
+def parse_hours(value):
+    """
+    Parse a number of hours
+
+    Raises:
+        ValueError: if the value is not a positive number
+    """
+    try:
+        hours = float(value)
+    except (ValueError, TypeError):
+        raise ValueError('Hours must be a positive number')
+    if not hours > 0:
+        raise ValueError('Hours must be a positive number')
+    return hours
+
+def detect_format(filename):
+    """Guess the timesheet format from a file name, defaulting to CSV"""
+    if str(filename).lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+def read_timesheet(f, file_format):
+    """
+    Stream validated work entries from a timesheet file
+
+    CSV files need a header row with 'date' and 'hours' columns and an
+    optional 'description' column. JSONL files hold one object per line
+    with the same keys. Rows are read one at a time, so files of any size
+    are handled in constant memory.
+
+    Args:
+        f: A text file object opened for reading
+        file_format: One of TIMESHEET_FORMATS
+
+    Yields:
+        (date, hours, description) tuples
+
+    Raises:
+        ValueError: on the first invalid row, naming its line number
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or not {'date', 'hours'} <= set(reader.fieldnames):
+            raise ValueError("CSV timesheets need a header row with 'date' and 'hours' columns")
+        rows = ((reader.line_num, row) for row in reader)
+    elif file_format == 'jsonl':
+        rows = _read_jsonl_rows(f)
+    else:
+        raise ValueError(f"Invalid timesheet format: {file_format}")
+
+    for line_number, row in rows:
+        try:
+            date = parse_date(row.get('date'))
+            hours = parse_hours(row.get('hours'))
+        except ValueError as e:
+            raise ValueError(f"Line {line_number}: {str(e)}")
+        yield date, hours, row.get('description') or ""
+
+def _read_jsonl_rows(f):
+    """Yield (line number, object) pairs from a JSONL file, skipping blank lines"""
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {line_number}: invalid JSON")
+        if not isinstance(row, dict):
+            raise ValueError(f"Line {line_number}: expected a JSON object")
+        yield line_number, row
+
+def write_timesheet(f, entries, file_format):
+    """
+    Stream work entries to a timesheet file
+
+    Entries are written as they are consumed, so an iterator over a long
+    history is exported in constant memory.
+
+    Args:
+        f: A text file object opened for writing
+        entries: iterable of work entry dicts
+        file_format: One of TIMESHEET_FORMATS
+
+    Returns:
+        int: the number of entries written
+    """
+    count = 0
+    if file_format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=TIMESHEET_FIELDS, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        for entry in entries:
+            writer.writerow(entry)
+            count += 1
+    elif file_format == 'jsonl':
+        for entry in entries:
+            f.write(json.dumps({field: entry.get(field) for field in TIMESHEET_FIELDS}) + '\n')
+            count += 1
+    else:
+        raise ValueError(f"Invalid timesheet format: {file_format}")
+    return count
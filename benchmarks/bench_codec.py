@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading and saving the data file with each installed JSON library
+
+Usage: python benchmarks/bench_codec.py [NUMBER_OF_ENTRIES ...]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aldo import codec
+from aldo.storage import EntryTable, json_default
+from bench_entries import make_entry_dicts
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+
+def installed_libraries():
+    """Get the JSON libraries that can be benchmarked here"""
+    return [library for library, module in (('orjson', codec.orjson), ('ujson', codec.ujson)) if module] + ['json']
+
+
+def timed(function):
+    """Run a function and get its wall-clock time in seconds"""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def bench(path, data, library, compact):
+    """Get (save seconds, load seconds, file size in bytes) of a data file"""
+    save = timed(lambda: codec.dump_file(path, data, default=json_default, compact=compact, library=library))
+    load = timed(lambda: codec.load_file(path, library=library))
+    return save, load, path.stat().st_size
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as test_dir:
+        path = Path(test_dir) / 'aldo_data.json'
+        for count in sizes:
+            # The data as save_data() passes it: work entries in an EntryTable
+            data = {'confirmed_invoices': {}, 'work_entries': EntryTable(make_entry_dicts(count))}
+            print(f"{count} entries:")
+            for library in installed_libraries():
+                for compact in (False, True):
+                    save, load, size = bench(path, data, library, compact)
+                    layout = 'compact' if compact else 'indent=2'
+                    print(f"  {library:<7} {layout:<9} save {save * 1000:9.1f} ms  "
+                          f"load {load * 1000:9.1f} ms  {size / 1e6:8.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
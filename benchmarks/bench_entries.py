@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory used per work entry: JSON entry dicts vs WorkEntry objects vs columns
+
+Usage: python benchmarks/bench_entries.py [NUMBER_OF_ENTRIES]
+"""
+
+import sys
+import json
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aldo.storage import ColumnarEntryTable, EntryTable, WorkEntry
+
+
+def make_entry_dicts(count):
+    """Create entry dicts like the ones in aldo_data.json, one per day"""
+    first_day = date(2000, 1, 1)
+    return [
+        {
+            "date": (first_day + timedelta(days=i)).strftime('%Y-%m-%d'),
+            "hours": float(i % 9 + 1),
+            "description": f"Work on task {i % 50}",
+            "timestamp": datetime(2000, 1, 1, 9, 0, i % 60).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def measure(build, count):
+    """Get the bytes retained per entry by the entries built from a loaded data file"""
+    # Parse from JSON so every entry owns its strings, like after load_data()
+    payload = json.dumps(make_entry_dicts(count))
+
+    tracemalloc.start()
+    result = build(json.loads(payload))
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del result
+    return retained / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    results = [
+        ("entry dicts", measure(lambda entries: entries, count)),
+        ("WorkEntry objects", measure(lambda entries: [WorkEntry.from_dict(entry) for entry in entries], count)),
+        ("EntryTable (WorkEntry + indexes)", measure(EntryTable, count)),
+        ("ColumnarEntryTable (typed arrays)", measure(ColumnarEntryTable, count)),
+    ]
+    print(f"Memory per entry for {count} entries:")
+    for name, per_entry in results:
+        print(f"  {name:<34} {per_entry:8.1f} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Tests for the Aldo JSON codec
+"""
+
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from aldo import codec
+from aldo.storage import WorkEntry, json_default
+
+# Libraries installed in the test environment; the json module always is
+LIBRARIES = [library for library, module in (('orjson', codec.orjson), ('ujson', codec.ujson)) if module] + ['json']
+
+
+class TestCodec(TestCase):
+    """Test encoding and decoding with every installed JSON library"""
+
+    data = {
+        "confirmed_invoices": {"391": {"invoice_number": "391"}},
+        "last_unconfirmed_invoice": None,
+        "work_entries": [WorkEntry.from_dict(
+            {"date": "2023-05-15", "hours": 6.5, "description": "Café", "timestamp": "2023-05-15T09:00:00"}
+        )],
+    }
+
+    def test_round_trip(self):
+        """Test every library produces the same document as the json module"""
+        expected = json.loads(json.dumps(self.data, default=json_default))
+        for library in LIBRARIES:
+            for compact in (False, True):
+                encoded = codec.dumps(self.data, default=json_default, compact=compact, library=library)
+                self.assertIsInstance(encoded, bytes)
+                self.assertEqual(codec.loads(encoded, library=library), expected, library)
+                self.assertEqual(json.loads(encoded), expected, library)
+
+    def test_compact_output(self):
+        """Test compact documents fit on one line and indented ones don't"""
+        for library in LIBRARIES:
+            self.assertNotIn(b'\n', codec.dumps(self.data, default=json_default, compact=True, library=library))
+            self.assertIn(b'\n  "', codec.dumps(self.data, default=json_default, library=library))
+
+    def test_files(self):
+        """Test documents written with dump_file are read back by load_file"""
+        with tempfile.TemporaryDirectory() as test_dir:
+            path = Path(test_dir) / 'data.json'
+            codec.dump_file(path, {"hours": [1, 2.5]}, compact=True)
+            self.assertEqual(codec.load_file(path), {"hours": [1, 2.5]})
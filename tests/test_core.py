@@ -0,0 +1,416 @@
+"""
+Tests for the Aldo command-line interface
+"""
+
+import os
+import sys
+import copy
+import json
+import tempfile
+import time
+import socket
+import subprocess
+from datetime import date
+from pathlib import Path
+from unittest import TestCase, mock
+
+from click.testing import CliRunner
+
+from aldo import core
+from aldo.config import DEFAULT_CONFIG
+from aldo.storage import WorkHoursStorage
+
+# Project root, so the subprocesses import this checkout of aldo
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Records files opened below ALDO_TEST_HOME while importing aldo.core
+IMPORT_AUDIT_SCRIPT = """
+import os
+import sys
+
+home = os.environ['ALDO_TEST_HOME']
+opened = []
+
+def audit(event, args):
+    if event == 'open' and isinstance(args[0], str) and args[0].startswith(home):
+        opened.append(args[0])
+
+sys.addaudithook(audit)
+import aldo.core
+print('\\n'.join(opened))
+"""
+
+
+# Subcommands timed by the startup benchmark, with whether they render PDFs
+STARTUP_COMMANDS = [
+    (['log', '2023-05-15', '6'], False),
+    (['summary', 'month'], False),
+    (['summary'], False),
+    (['export', '--from', '2023-05-01'], False),
+    (['confirm', '391'], False),
+    (['generate-invoice', '2023-05-31', '-o', 'invoice.pdf'], True),
+]
+
+
+def aldo_environment(home):
+    """Environment pointing the aldo config and data dirs below a test directory"""
+    env = dict(os.environ)
+    env.update({
+        'ALDO_TEST_HOME': str(home),
+        'XDG_CONFIG_HOME': str(Path(home) / 'config'),
+        'XDG_DATA_HOME': str(Path(home) / 'data'),
+        'PYTHONPATH': str(ROOT_DIR),
+    })
+    return env
+
+
+class TestImportTime(TestCase):
+    """Test importing the CLI module has no side effects"""
+
+    def test_import_performs_no_file_io(self):
+        """Test 'import aldo.core' reads neither the config nor the data file"""
+        with tempfile.TemporaryDirectory() as home:
+            config_dir = Path(home) / 'config' / 'aldo'
+            data_dir = Path(home) / 'data' / 'aldo'
+            config_dir.mkdir(parents=True)
+            data_dir.mkdir(parents=True)
+            (config_dir / 'config.json').write_text(json.dumps({}))
+            (data_dir / 'aldo_data.json').write_text(json.dumps({'work_entries': []}))
+
+            result = subprocess.run(
+                [sys.executable, '-c', IMPORT_AUDIT_SCRIPT],
+                env=aldo_environment(home), capture_output=True, text=True, check=True
+            )
+            self.assertEqual(result.stdout.strip(), '')
+            self.assertEqual(sorted(path.name for path in data_dir.iterdir()), ['aldo_data.json'])
+
+    def test_help_and_version_create_no_files(self):
+        """Test --help and --version work without config or data directories"""
+        with tempfile.TemporaryDirectory() as home:
+            for args in (['--help'], ['--version'], ['log', '--help']):
+                subprocess.run(
+                    [sys.executable, '-m', 'aldo.cli'] + args,
+                    env=aldo_environment(home), capture_output=True, check=True
+                )
+            self.assertEqual(list(Path(home).iterdir()), [])
+
+
+class TestStartupImports(TestCase):
+    """Cold-start benchmark of the subcommands based on python -X importtime"""
+
+    def run_with_importtime(self, home, args):
+        """
+        Run an aldo subcommand in a fresh interpreter
+
+        Returns:
+            (dict of imported module -> cumulative import time in us, total import time in us)
+        """
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'aldo.cli'] + args,
+            env=aldo_environment(home), cwd=home, capture_output=True, text=True
+        )
+        modules = {}
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(cumulative_us)
+            total += int(self_us)
+        return modules, total
+
+    def test_pdf_stack_is_imported_only_for_invoices(self):
+        """Test only generate-invoice imports reportlab, and report import times"""
+        timings = []
+        with tempfile.TemporaryDirectory() as home:
+            for args, renders_pdf in STARTUP_COMMANDS:
+                modules, total = self.run_with_importtime(home, args)
+                timings.append((' '.join(args[:2]), total, len(modules)))
+
+                self.assertIn('aldo.core', modules)
+                self.assertEqual('reportlab' in modules, renders_pdf, f"reportlab imported by 'aldo {args[0]}'")
+                self.assertEqual('aldo.invoice' in modules, renders_pdf)
+
+        print("\nCold-start import time per subcommand:")
+        for command, total, count in timings:
+            print(f"  aldo {command:<32} {total / 1000:8.1f} ms  ({count} modules)")
+
+
+class TestDaemon(TestCase):
+    """Test forwarding commands to 'aldo daemon'"""
+
+    def setUp(self):
+        """Start a daemon with the config and data dirs below a test directory"""
+        test_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(test_dir.cleanup)
+        self.home = test_dir.name
+        self.env = aldo_environment(self.home)
+        self.socket = Path(self.home) / 'data' / 'aldo' / 'aldo.sock'
+
+        self.daemon = subprocess.Popen(
+            [sys.executable, '-m', 'aldo.cli', 'daemon'],
+            env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.addCleanup(self.daemon.wait, 10)
+        self.addCleanup(self.daemon.kill)
+        deadline = time.monotonic() + 10
+        while not self.socket.exists():
+            self.assertLess(time.monotonic(), deadline, "daemon did not start")
+            time.sleep(0.05)
+
+    def aldo(self, *args, env=None):
+        """Run an aldo command, returning (stdout, stderr, exit code, modules it imported)"""
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'aldo.cli'] + list(args),
+            env=env or self.env, cwd=self.home, capture_output=True, text=True
+        )
+        modules = {line.split('|')[-1].strip() for line in result.stderr.splitlines()
+                   if line.startswith('import time:')}
+        stderr = '\n'.join(line for line in result.stderr.splitlines() if not line.startswith('import time:'))
+        return result.stdout, stderr, result.returncode, modules
+
+    def test_commands_run_in_daemon(self):
+        """Test forwarded commands produce the same output without loading aldo.core"""
+        stdout, _, code, modules = self.aldo('log', '2023-05-15', '6', 'Daemon work')
+        self.assertEqual(code, 0)
+        self.assertEqual(stdout, "Successfully logged 6.0 hours on 2023-05-15 - 'Daemon work'\n")
+        self.assertNotIn('aldo.core', modules)
+        self.assertNotIn('click', modules)
+
+        stdout, _, code, modules = self.aldo('total', '2023-05-01', '2023-05-31')
+        self.assertEqual(stdout, "Total hours from 2023-05-01 to 2023-05-31: 6.00\n")
+        self.assertNotIn('aldo.core', modules)
+
+        # Errors keep their exit code and stream
+        _, stderr, code, _ = self.aldo('log', 'someday', '6')
+        self.assertEqual(code, 2)
+        self.assertIn("Invalid value for 'DATE'", stderr)
+
+        # Exports to standard output are streamed by the calling process
+        stdout, stderr, code, modules = self.aldo('export')
+        self.assertEqual((code, stderr), (0, ''))
+        self.assertEqual(len(stdout.splitlines()), 2)
+        self.assertTrue(stdout.splitlines()[1].startswith('2023-05-15,6.0,Daemon work,'))
+        self.assertIn('aldo.core', modules)
+
+        # Exports to files run in the daemon, relative to the client's working directory
+        _, _, code, modules = self.aldo('export', '--output', 'hours.csv')
+        self.assertEqual(code, 0)
+        self.assertNotIn('aldo.core', modules)
+        self.assertIn('2023-05-15,6.0,Daemon work', (Path(self.home) / 'hours.csv').read_text())
+
+    def test_bad_connections_keep_daemon_running(self):
+        """Test truncated requests and clients leaving early don't stop the daemon"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(self.socket))
+            client.sendall(b'{"args": ["total"')
+            client.shutdown(socket.SHUT_WR)
+            self.assertEqual(client.recv(1024), b'')
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(self.socket))
+            client.sendall(json.dumps({'args': ['total', '2023-05-01', '2023-05-31'], 'cwd': self.home}).encode())
+            # Closed without reading the response, as after Ctrl-C
+
+        stdout, _, code, modules = self.aldo('total', '2023-05-01', '2023-05-31')
+        self.assertEqual(code, 0)
+        self.assertEqual(stdout, "Total hours from 2023-05-01 to 2023-05-31: 0.00\n")
+        self.assertNotIn('aldo.core', modules)
+        self.assertIsNone(self.daemon.poll())
+
+    def test_daemon_sees_changes_of_other_processes(self):
+        """Test the daemon reloads data written by commands running without it"""
+        no_daemon = dict(self.env, ALDO_NO_DAEMON='1')
+        _, _, code, modules = self.aldo('log', '2023-05-16', '2', env=no_daemon)
+        self.assertEqual(code, 0)
+        self.assertIn('aldo.core', modules)
+
+        stdout, _, _, modules = self.aldo('total', '2023-05-01', '2023-05-31')
+        self.assertNotIn('aldo.core', modules)
+        self.assertEqual(stdout, "Total hours from 2023-05-01 to 2023-05-31: 2.00\n")
+
+    def test_stop_falls_back_to_local_commands(self):
+        """Test commands run in their own process once the daemon stopped"""
+        stdout, _, _, _ = self.aldo('daemon', '--stop')
+        self.assertEqual(stdout, "Daemon stopped.\n")
+        self.assertEqual(self.daemon.wait(10), 0)
+        self.assertFalse(self.socket.exists())
+
+        stdout, _, code, modules = self.aldo('log', '2023-05-17', '3')
+        self.assertEqual(code, 0)
+        self.assertIn('aldo.core', modules)
+        self.assertEqual(stdout, "Successfully logged 3.0 hours on 2023-05-17\n")
+
+
+class MemoryConfig:
+    """Default configuration without a config file, standing in for aldo.config.Config"""
+
+    def __init__(self):
+        """Initialize with a copy of the defaults"""
+        self.config = copy.deepcopy(DEFAULT_CONFIG)
+
+    def get_config(self):
+        """Get the configuration"""
+        return self.config
+
+
+class StorageCLITestCase(TestCase):
+    """Base class for tests running commands in-process against a temporary storage"""
+
+    def setUp(self):
+        """Set up a storage in a temporary data directory as the CLI's storage"""
+        test_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(test_dir.cleanup)
+        self.home = test_dir.name
+        self.storage = WorkHoursStorage(data_dir=self.home)
+        self.config = MemoryConfig()
+        for name, value in (('_config', self.config), ('_storage', self.storage)):
+            patcher = mock.patch.object(core, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestShell(StorageCLITestCase):
+    """Test 'aldo shell'"""
+
+    def test_commands_share_one_storage(self):
+        """Test commands run against the loaded storage and errors don't end the shell"""
+        commands = "\n".join([
+            "log 2023-05-15 6 'Shell work'",
+            "# comments and blank lines are skipped",
+            "",
+            "log someday 1",
+            "total 2023-05-01 2023-05-31",
+            "daemon",
+            "exit",
+            "total 2023-05-01 2023-05-31",
+        ])
+        result = CliRunner().invoke(core.cli, ['shell'], input=commands)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Successfully logged 6.0 hours on 2023-05-15 - 'Shell work'", result.output)
+        self.assertIn("Invalid value for 'DATE'", result.output)
+        self.assertIn("'aldo daemon' can't be run from the shell", result.output)
+        self.assertEqual(result.output.count("Total hours from 2023-05-01 to 2023-05-31: 6.00"), 1)
+        self.assertEqual(len(WorkHoursStorage(data_dir=self.home).get_entries_for_date('2023-05-15')), 1)
+
+    def test_batch_saves_once_on_exit(self):
+        """Test --batch saves all changes of the session at once"""
+        commands = "\n".join(f"log 2023-05-{day:02d} 1" for day in range(1, 11))
+        with mock.patch.object(self.storage, 'save_data', wraps=self.storage.save_data) as save_data:
+            result = CliRunner().invoke(core.cli, ['shell', '--batch'], input=commands)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(save_data.call_count, 1)
+        self.assertEqual(WorkHoursStorage(data_dir=self.home).total_hours(date(2023, 5, 1), date(2023, 5, 31)), 10)
+
+
+class TestBatch(StorageCLITestCase):
+    """Test 'aldo batch'"""
+
+    script = "\n".join([
+        "# Hours of the first week",
+        "log 2023-05-01 8 'Kickoff meeting'",
+        "log 2023-05-02 6",
+        "log 2023-05-40 1",
+        "log 2023-05-03 4",
+    ])
+
+    def total(self):
+        """Get the saved hours of May 2023"""
+        return WorkHoursStorage(data_dir=self.home).total_hours(date(2023, 5, 1), date(2023, 5, 31))
+
+    def test_script_saves_once(self):
+        """Test a script's changes are saved with a single save"""
+        script = self.script.replace("2023-05-40", "2023-05-04")
+        with mock.patch.object(self.storage, 'save_data', wraps=self.storage.save_data) as save_data:
+            result = CliRunner().invoke(core.cli, ['batch', '-'], input=script)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Successfully logged 8.0 hours on 2023-05-01 - 'Kickoff meeting'", result.output)
+        self.assertEqual(save_data.call_count, 1)
+        self.assertEqual(self.total(), 19)
+
+    def test_failed_command_saves_nothing(self):
+        """Test the script stops at a failed command and its earlier changes are discarded"""
+        result = CliRunner().invoke(core.cli, ['batch', '-'], input=self.script)
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("line 4: 'log 2023-05-40 1' failed with exit code 2, no changes were saved", result.output)
+        self.assertNotIn("2023-05-03", result.output)
+        self.assertEqual(self.total(), 0)
+        self.assertEqual(self.storage.total_hours(date(2023, 5, 1), date(2023, 5, 31)), 0)
+
+    def test_keep_going_saves_successful_commands(self):
+        """Test --keep-going runs the rest of the script and reports the failures"""
+        result = CliRunner().invoke(core.cli, ['batch', '--keep-going', '-'], input=self.script)
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("1 of 4 commands failed (lines 4)", result.output)
+        self.assertEqual(self.total(), 18)
+
+    def test_invalid_script_runs_nothing(self):
+        """Test syntax errors are reported before any command runs"""
+        result = CliRunner().invoke(core.cli, ['batch', '-'], input="log 2023-05-01 8\nlog 2023-05-02 6 'unclosed")
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("line 2: No closing quotation", result.output)
+        self.assertNotIn("Successfully logged", result.output)
+
+
+class TestRegenerateInvoices(StorageCLITestCase):
+    """Test 'aldo regenerate-invoices'"""
+
+    def setUp(self):
+        """Confirm invoices #391, #401 and #411 for May to July 2023"""
+        super().setUp()
+        for month, number in ((5, 391), (6, 401), (7, 411)):
+            self.storage.log_many((date(2023, month, day), 2, "Work") for day in range(1, 29))
+            self.storage.store_unconfirmed_invoice(str(number), date(2023, month, 1), date(2023, month, 28), self.config)
+            self.storage.confirm_invoice(str(number), self.config)
+        self.output_dir = Path(self.home) / 'invoices'
+
+    def regenerate(self, *args):
+        """Run the command, returning its result and the names of the PDFs it wrote"""
+        result = CliRunner().invoke(core.cli, ['regenerate-invoices', '-d', str(self.output_dir)] + list(args))
+        names = sorted(path.name for path in self.output_dir.iterdir()) if self.output_dir.exists() else []
+        return result, names
+
+    def test_all_invoices_in_worker_processes(self):
+        """Test --all renders every confirmed invoice"""
+        result, names = self.regenerate('--all', '--jobs', '2')
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(names, ['INV-0391.pdf', 'INV-0401.pdf', 'INV-0411.pdf'])
+        self.assertIn("Invoice #INV-0401 regenerated", result.output)
+        for name in names:
+            self.assertEqual((self.output_dir / name).read_bytes()[:4], b'%PDF')
+
+    def test_range_of_invoices(self):
+        """Test --from and --to select invoices by number, inclusive"""
+        result, names = self.regenerate('--from', '395', '--to', '401', '--jobs', '1')
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(names, ['INV-0401.pdf'])
+
+        result, names = self.regenerate('--to', '300')
+        self.assertEqual(result.output, "No confirmed invoices to regenerate.\n")
+
+    def test_unchanged_invoices_are_copied_from_cache(self):
+        """Test a second run copies the cached PDFs until an invoice's contents change"""
+        self.regenerate('--all', '--jobs', '1')
+        result, names = self.regenerate('--all')
+        self.assertEqual(result.output.count("regenerated from cache"), 3)
+
+        self.config.config['payment']['hourly_rate'] = 80
+        self.config.config['invoice']['footer_text'] = "Not on the invoice"
+        result, _ = self.regenerate('--from', '391', '--to', '401', '--jobs', '1')
+        self.assertNotIn("from cache", result.output)
+
+        result, _ = self.regenerate('--from', '391', '--to', '401', '--no-cache', '--jobs', '1')
+        self.assertNotIn("from cache", result.output)
+        self.assertEqual(result.output.count("regenerated"), 2)
+
+        result = CliRunner().invoke(core.cli, ['generate-invoice', '391', '-o', str(self.output_dir / 'copy.pdf')])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual((self.output_dir / 'copy.pdf').read_bytes(), (self.output_dir / 'INV-0391.pdf').read_bytes())
+
+    def test_selection_is_required(self):
+        """Test the invoices must be selected with either --all or a range"""
+        for args in ([], ['--all', '--from', '391']):
+            result, names = self.regenerate(*args)
+            self.assertEqual(result.exit_code, 2)
+            self.assertIn("Use either --all or --from/--to", result.output)
+            self.assertEqual(names, [])
@@ -0,0 +1,71 @@
+"""
+Tests for Aldo's atomic file writes
+"""
+
+import os
+import stat
+import tempfile
+from pathlib import Path
+from datetime import date
+from unittest import TestCase, mock
+
+from aldo.fileio import write_atomic
+from aldo.storage import WorkHoursStorage
+
+
+class TestWriteAtomic(TestCase):
+    """Test files are replaced atomically with the requested durability"""
+
+    def setUp(self):
+        """Set up a temporary directory with an existing file"""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.test_dir.cleanup)
+        self.path = Path(self.test_dir.name) / 'aldo_data.json'
+        self.path.write_bytes(b'old')
+
+    def test_replaces_file(self):
+        """Test the file gets the new contents and no temporary file is left"""
+        write_atomic(self.path, b'new')
+        self.assertEqual(self.path.read_bytes(), b'new')
+        self.assertEqual(os.listdir(self.test_dir.name), ['aldo_data.json'])
+
+    def test_keeps_file_mode(self):
+        """Test the replaced file keeps its permissions and new files get the default ones"""
+        os.chmod(self.path, 0o600)
+        write_atomic(self.path, b'new')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        new_path = Path(self.test_dir.name) / 'config.json'
+        umask = os.umask(0o022)
+        os.umask(umask)
+        write_atomic(new_path, b'new')
+        self.assertEqual(stat.S_IMODE(os.stat(new_path).st_mode), 0o666 & ~umask)
+
+    def test_failed_write_keeps_old_contents(self):
+        """Test a write failing halfway leaves the previous file untouched"""
+        with mock.patch('os.replace', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                write_atomic(self.path, b'new')
+        self.assertEqual(self.path.read_bytes(), b'old')
+        self.assertEqual(os.listdir(self.test_dir.name), ['aldo_data.json'])
+
+    def test_durability_levels(self):
+        """Test each durability level syncs the file and directory as documented"""
+        for durability, syncs in (('none', 0), ('file', 1), ('dir', 2)):
+            with mock.patch('os.fsync') as fsync:
+                write_atomic(self.path, b'new', durability)
+            self.assertEqual(fsync.call_count, syncs, durability)
+
+        with self.assertRaises(ValueError):
+            write_atomic(self.path, b'new', 'always')
+
+    def test_storage_encoding_error_keeps_data_file(self):
+        """Test an entry that can't be saved doesn't truncate the data file"""
+        self.path.unlink()
+        storage = WorkHoursStorage(data_dir=self.test_dir.name, settings={'durability': 'none'})
+        storage.log_work(date(2023, 5, 15), 6)
+        saved = self.path.read_bytes()
+
+        with self.assertRaises(Exception):
+            storage.log_work(date(2023, 5, 16), 2, object())
+        self.assertEqual(self.path.read_bytes(), saved)
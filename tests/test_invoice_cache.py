@@ -0,0 +1,83 @@
+"""
+Tests for the cache of rendered invoice PDFs
+"""
+
+import os
+import copy
+import tempfile
+from pathlib import Path
+from datetime import date
+from unittest import TestCase
+
+from aldo.config import DEFAULT_CONFIG
+from aldo.invoice_cache import InvoiceCache
+from aldo.storage import WorkEntry, date_ordinal
+
+
+class Config:
+    """Default configuration without a config file"""
+
+    def __init__(self):
+        """Initialize with a copy of the defaults"""
+        self.config = copy.deepcopy(DEFAULT_CONFIG)
+
+    def get_config(self):
+        """Get the configuration"""
+        return self.config
+
+
+class TestInvoiceCache(TestCase):
+    """Test storing, fetching and evicting cached invoice PDFs"""
+
+    def setUp(self):
+        """Set up a cache and a rendered PDF in a temporary directory"""
+        test_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(test_dir.cleanup)
+        self.test_dir = Path(test_dir.name)
+        self.cache = InvoiceCache(self.test_dir / 'cache', max_bytes=3500)
+        self.pdf = self.test_dir / 'rendered.pdf'
+        self.pdf.write_bytes(b'%PDF' + b'x' * 996)
+
+    def key(self, config=None, entries=None, total_hours=8):
+        """Get the cache key of invoice INV-0391 for May 2023"""
+        if entries is None:
+            entries = [WorkEntry(date_ordinal('2023-05-15'), 8, 'Work')]
+        return InvoiceCache.key(config or Config(), 'INV-0391', date(2023, 5, 1), date(2023, 5, 31),
+                                entries, total_hours)
+
+    def test_key_covers_invoice_contents(self):
+        """Test the key only changes with what the invoice shows"""
+        key = self.key()
+        self.assertEqual(key, self.key(entries=[{'date': '2023-05-15', 'hours': 8, 'description': 'Work'}]))
+        self.assertNotEqual(key, self.key(entries=[WorkEntry(date_ordinal('2023-05-15'), 7, 'Work')], total_hours=7))
+
+        config = Config()
+        config.config['invoice']['next_number'] = 2000
+        self.assertEqual(key, self.key(config))
+        config.config['payment']['hourly_rate'] = 80
+        self.assertNotEqual(key, self.key(config))
+
+    def test_fetch_copies_stored_pdf(self):
+        """Test a stored PDF is copied to the output file"""
+        output = self.test_dir / 'invoice.pdf'
+        self.assertIsNone(self.cache.fetch(self.key(), output))
+        self.assertFalse(output.exists())
+
+        self.cache.store(self.key(), self.pdf)
+        self.assertEqual(self.cache.fetch(self.key(), output), str(output.resolve()))
+        self.assertEqual(output.read_bytes(), self.pdf.read_bytes())
+
+    def test_evicts_least_recently_used(self):
+        """Test the cache drops the PDFs used longest ago once it outgrows its limit"""
+        keys = [self.key(total_hours=hours) for hours in range(3)]
+        for age, key in enumerate(keys):
+            self.cache.store(key, self.pdf)
+            stamp = 1_000_000_000 + age
+            os.utime(self.cache.cache_dir / f"{key}.pdf", (stamp, stamp))
+
+        # Using the oldest PDF makes the second one the least recently used
+        self.cache.fetch(keys[0], self.test_dir / 'invoice.pdf')
+        self.cache.store(self.key(total_hours=3), self.pdf)
+
+        cached = {path.stem for path in self.cache.cache_dir.iterdir()}
+        self.assertEqual(cached, {keys[0], keys[2], self.key(total_hours=3)})
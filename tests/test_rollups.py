@@ -0,0 +1,106 @@
+"""
+Tests for the Aldo hour rollups
+"""
+
+from datetime import date
+from unittest import TestCase
+
+from aldo.rollups import FenwickTree, HourRollups
+
+
+class TestHourRollups(TestCase):
+    """Test incrementally maintained hour totals"""
+
+    def setUp(self):
+        """Set up rollups over entries spanning two years"""
+        self.entries = [
+            {"date": "2022-12-31", "hours": 1},
+            {"date": "2023-01-01", "hours": 2},
+            {"date": "2023-02-28", "hours": 4},
+            {"date": "2023-03-01", "hours": 8},
+            {"date": "2023-12-31", "hours": 16},
+            {"date": "2024-01-02", "hours": 32},
+        ]
+        self.rollups = HourRollups.from_entries(self.entries)
+
+    def brute_force_total(self, start_date, end_date):
+        """Sum the raw entries within a range"""
+        start_str, end_str = start_date.isoformat(), end_date.isoformat()
+        return sum(entry["hours"] for entry in self.entries if start_str <= entry["date"] <= end_str)
+
+    def test_period_totals(self):
+        """Test totals per day, ISO week, month and year"""
+        self.assertEqual(self.rollups.get('years', '2023'), 30)
+        self.assertEqual(self.rollups.get('months', '2023-02'), 4)
+        self.assertEqual(self.rollups.get('weeks', '2022-W52'), 3)
+        self.assertEqual(self.rollups.get('days', '2023-03-01'), 8)
+        self.assertEqual(self.rollups.entry_count, 6)
+
+    def test_range_totals_match_entries(self):
+        """Test range totals combining years, months and days match the raw entries"""
+        ranges = [
+            (date(2022, 1, 1), date(2024, 12, 31)),
+            (date(2022, 12, 31), date(2024, 1, 1)),
+            (date(2023, 2, 1), date(2023, 2, 28)),
+            (date(2023, 2, 15), date(2023, 3, 15)),
+            (date(2023, 3, 2), date(2023, 12, 30)),
+        ]
+        for start_date, end_date in ranges:
+            self.assertEqual(self.rollups.total(start_date, end_date), self.brute_force_total(start_date, end_date))
+
+    def test_whole_periods_use_their_level(self):
+        """Test totals of whole ISO weeks, months and years are read without the range-sum index"""
+        periods = [
+            (date(2023, 1, 1), date(2023, 12, 31)),
+            (date(2023, 2, 1), date(2023, 2, 28)),
+            (date(2022, 12, 26), date(2023, 1, 1)),
+        ]
+        for start_date, end_date in periods:
+            self.assertEqual(self.rollups.total(start_date, end_date), self.brute_force_total(start_date, end_date))
+        self.assertIsNone(self.rollups._fenwick)
+
+    def test_range_totals_after_updates(self):
+        """Test the range-sum index follows updates inside and outside its span"""
+        self.rollups.total(date(2023, 1, 1), date(2023, 12, 31))
+        self.rollups.update({"date": "2023-06-01", "hours": 64}, [])
+        self.rollups.update({"date": "2030-06-01", "hours": 128}, [])
+        self.rollups.update({"date": "2020-06-01", "hours": 256}, [])
+        self.entries += [
+            {"date": "2023-06-01", "hours": 64},
+            {"date": "2030-06-01", "hours": 128},
+            {"date": "2020-06-01", "hours": 256},
+        ]
+        for start_date, end_date in [(date(2023, 1, 1), date(2023, 12, 31)), (date(2019, 1, 1), date(2031, 1, 1))]:
+            self.assertEqual(self.rollups.total(start_date, end_date), self.brute_force_total(start_date, end_date))
+
+    def test_replacing_an_entry_updates_totals(self):
+        """Test replaced entries are subtracted and empty periods dropped"""
+        self.rollups.update({"date": "2023-03-01", "hours": 3}, [{"date": "2023-03-01", "hours": 8}])
+        self.assertEqual(self.rollups.get('months', '2023-03'), 3)
+        self.assertEqual(self.rollups.get('years', '2023'), 25)
+
+        self.rollups.update(None, [{"date": "2024-01-02", "hours": 32}])
+        self.assertNotIn('2024', self.rollups.data['years'])
+        self.assertEqual(self.rollups.entry_count, 5)
+
+    def test_day_totals(self):
+        """Test daily totals for short and long ranges"""
+        self.assertEqual(self.rollups.day_totals(date(2023, 2, 28), date(2023, 3, 1)), {"2023-02-28": 4, "2023-03-01": 8})
+        self.assertEqual(list(self.rollups.day_totals(date(2000, 1, 1), date(2030, 1, 1))), [
+            entry["date"] for entry in self.entries
+        ])
+
+
+class TestFenwickTree(TestCase):
+    """Test the range-sum index over day ordinals"""
+
+    def test_range_sums(self):
+        """Test range sums against a plain list of daily hours"""
+        hours = [float(i % 7) for i in range(100)]
+        tree = FenwickTree(1000, len(hours), {1000 + i: value for i, value in enumerate(hours) if value})
+        tree.add(1050, 2.5)
+        hours[50] += 2.5
+
+        for start, end in [(0, 99), (10, 20), (50, 50), (0, 0), (99, 99), (30, 10)]:
+            self.assertEqual(tree.range_sum(1000 + start, 1000 + end), sum(hours[start:end + 1]))
+        self.assertEqual(tree.range_sum(900, 2000), sum(hours))
@@ -0,0 +1,593 @@
+"""
+Tests for the Aldo storage backends
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+import subprocess
+from pathlib import Path
+from datetime import date, timedelta
+from unittest import TestCase, mock
+
+from aldo.storage import WorkHoursStorage, WorkEntry, ColumnarEntryTable, json_default
+from aldo.journal import JournaledWorkHoursStorage
+from aldo.sharded_storage import ShardedWorkHoursStorage
+from aldo.sqlite_storage import SQLiteWorkHoursStorage
+from aldo.binary_storage import BinaryWorkHoursStorage
+
+
+# Logs a day of May 2023 for each of the given days, in its own process
+CONCURRENT_WRITER_SCRIPT = """
+import sys
+import importlib
+from datetime import date
+
+module_name, class_name, data_dir = sys.argv[1:4]
+storage_class = getattr(importlib.import_module(module_name), class_name)
+storage = storage_class(data_dir=data_dir)
+for day in sys.argv[4:]:
+    storage.log_work(date(2023, 5, int(day)), 1)
+storage.close()
+"""
+
+
+class StorageBackendTests:
+    """Behaviour shared by every storage backend"""
+
+    storage_class = None
+
+    def setUp(self):
+        """Set up a storage in a temporary data directory"""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.test_dir.name) / 'data'
+        self.storage = self.open_storage()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        if hasattr(self.storage, 'close'):
+            self.storage.close()
+        self.test_dir.cleanup()
+
+    def open_storage(self):
+        """Open a new storage instance on the test data directory"""
+        return self.storage_class(data_dir=self.data_dir)
+
+    def reopen_storage(self):
+        """Close the storage and open it again from disk"""
+        if hasattr(self.storage, 'close'):
+            self.storage.close()
+        self.storage = self.open_storage()
+        return self.storage
+
+    def test_log_work_replaces_entry_for_same_date(self):
+        """Test logging twice on one date keeps only the latest entry"""
+        self.storage.log_work(date(2023, 5, 15), 6, "First")
+        self.storage.log_work(date(2023, 5, 15), 3, "Second")
+
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["hours"], 3)
+        self.assertEqual(entries[0]["description"], "Second")
+
+    def test_get_work_entries_range(self):
+        """Test range queries return sorted entries within the bounds"""
+        for day, hours in [(30, 8), (1, 4), (15, 6)]:
+            self.storage.log_work(date(2023, 5, day), hours, f"Work {day}")
+        self.storage.log_work(date(2023, 6, 15), 7)
+
+        result = self.storage.get_work_entries(date(2023, 5, 10), date(2023, 6, 10))
+        self.assertEqual([entry["date"] for entry in result], ["2023-05-15", "2023-05-30"])
+        self.assertEqual(self.storage.get_earliest_entry_date(), date(2023, 5, 1))
+        self.assertEqual(self.storage.get_latest_entry_date(), date(2023, 6, 15))
+
+        streamed = self.storage.iter_work_entries(date(2023, 5, 10), date(2023, 6, 10))
+        self.assertEqual(list(streamed), result)
+
+    def test_get_entries_for_date(self):
+        """Test day lookups and summaries group entries by date"""
+        today = date.today()
+        self.storage.log_work(today, 6, "Today")
+        self.storage.log_work(today - timedelta(days=1), 2, "Yesterday")
+
+        self.assertEqual([entry["hours"] for entry in self.storage.get_entries_for_date(today)], [6])
+        self.assertEqual(self.storage.get_entries_for_date(today - timedelta(days=2)), [])
+
+        summary = self.storage.get_summary('week')
+        self.assertEqual(summary[today.strftime('%Y-%m-%d')], [{"hours": 6, "description": "Today"}])
+        self.assertEqual(len(summary), 2)
+
+    def test_hour_totals(self):
+        """Test daily and range totals follow logged and replaced entries"""
+        self.storage.log_work(date(2023, 5, 15), 6)
+        self.storage.log_work(date(2023, 5, 16), 2)
+        self.storage.log_work(date(2023, 6, 1), 1)
+        self.storage.log_work(date(2023, 5, 15), 3)
+
+        storage = self.reopen_storage()
+        self.assertEqual(storage.get_daily_totals(date(2023, 5, 1), date(2023, 5, 31)), {"2023-05-15": 3, "2023-05-16": 2})
+        self.assertEqual(storage.total_hours(date(2023, 5, 1), date(2023, 5, 31)), 5)
+        self.assertEqual(storage.total_hours(date(2023, 1, 1), date(2023, 12, 31)), 6)
+
+    def test_log_many_in_batch(self):
+        """Test log_many logs every entry and persists them"""
+        count = self.storage.log_many((date(2023, 5, day), day, f"Day {day}") for day in range(1, 21))
+        self.assertEqual(count, 20)
+
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual([entry["hours"] for entry in entries], list(range(1, 21)))
+
+    def test_batch_rolls_back_on_error(self):
+        """Test a failing batch leaves neither memory nor disk changed"""
+        self.storage.log_work(date(2023, 5, 1), 4)
+
+        with self.assertRaises(RuntimeError):
+            with self.storage.batch():
+                self.storage.log_work(date(2023, 5, 1), 8)
+                self.storage.log_work(date(2023, 5, 2), 2)
+                raise RuntimeError("Import failed")
+
+        entries = self.storage.get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual([entry["hours"] for entry in entries], [4])
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual([entry["hours"] for entry in entries], [4])
+
+    def test_invoice_state_persists(self):
+        """Test confirmed invoices survive reopening the storage"""
+        config = type('Config', (), {'config': {'invoice': {'prefix': 'INV-'}}})()
+        self.storage.log_work(date(2023, 5, 15), 6)
+        self.storage.store_unconfirmed_invoice('INV-391', date(2023, 5, 1), date(2023, 5, 31), config)
+        self.assertTrue(self.storage.confirm_invoice('391', config))
+
+        storage = self.reopen_storage()
+        self.assertEqual(storage.get_last_confirmed_invoice().end_date, '2023-05-31')
+        self.assertEqual(storage.get_invoice_by_number('INV-391', config).start_date, '2023-05-01')
+        self.assertEqual(storage.get_next_invoice_number(), 401)
+
+    def test_concurrent_instances_see_each_other(self):
+        """Test an open storage picks up the changes of another instance before changing the data"""
+        other = self.open_storage()
+        self.storage.log_work(date(2023, 5, 1), 4)
+        other.log_work(date(2023, 5, 2), 2)
+        self.storage.log_work(date(2023, 5, 3), 1)
+
+        self.assertTrue(other.refresh())
+        self.assertEqual(len(other.get_work_entries(date(2023, 5, 1), date(2023, 5, 31))), 3)
+        self.assertFalse(other.refresh())
+        other.close()
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual([entry["hours"] for entry in entries], [4, 2, 1])
+
+    def test_concurrent_processes_lose_no_entries(self):
+        """Test processes logging at the same time keep each other's entries"""
+        env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parent.parent))
+        args = [self.storage_class.__module__, self.storage_class.__name__, str(self.data_dir)]
+        writers = [
+            subprocess.Popen([sys.executable, '-c', CONCURRENT_WRITER_SCRIPT] + args +
+                             [str(day) for day in range(first_day, 31, 3)], env=env, stdout=subprocess.DEVNULL)
+            for first_day in (1, 2, 3)
+        ]
+        for writer in writers:
+            self.assertEqual(writer.wait(timeout=60), 0)
+
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual(len(entries), 30)
+
+    def test_replace_all_from_export(self):
+        """Test migrating data between backends through export_data/replace_all"""
+        source = WorkHoursStorage(data_dir=Path(self.test_dir.name) / 'source')
+        source.log_work(date(2023, 5, 15), 6, "Migrated")
+        source.aldo_data['confirmed_invoices']['391'] = {
+            'invoice_number': '391', 'start_date': '2023-05-01', 'end_date': '2023-05-31'
+        }
+
+        self.storage.replace_all(source.export_data())
+        storage = self.reopen_storage()
+        self.assertEqual(storage.export_data()['work_entries'], source.export_data()['work_entries'])
+        self.assertIn('391', storage.aldo_data['confirmed_invoices'])
+
+
+class TestJSONStorage(StorageBackendTests, TestCase):
+    """Test the default JSON file backend"""
+
+    storage_class = WorkHoursStorage
+
+    def test_log_work_replaces_legacy_duplicate_entries(self):
+        """Test data with several entries per date (older versions) is cleaned up on replace"""
+        self.storage.replace_all({'work_entries': [
+            {"date": "2023-05-15", "hours": 6, "description": "Work 1", "timestamp": "2023-05-15T09:00:00"},
+            {"date": "2023-05-14", "hours": 4, "description": "Work 2", "timestamp": "2023-05-14T09:00:00"},
+            {"date": "2023-05-15", "hours": 2, "description": "Work 3", "timestamp": "2023-05-15T14:00:00"},
+        ]})
+        self.assertEqual(len(self.reopen_storage().get_entries_for_date("2023-05-15")), 2)
+
+        self.storage.log_work(date(2023, 5, 15), 8)
+        self.assertEqual([entry["hours"] for entry in self.storage.get_entries_for_date("2023-05-15")], [8])
+        self.assertEqual([entry["hours"] for entry in self.storage.get_entries_for_date("2023-05-14")], [4])
+
+        # Entries are written back in date order
+        with open(self.storage.data_file) as f:
+            self.assertEqual([entry["date"] for entry in json.load(f)["work_entries"]], ["2023-05-14", "2023-05-15"])
+
+    def test_rollups_follow_edited_entries(self):
+        """Test stored rollups are rebuilt when the data file was edited without updating them"""
+        self.storage.log_work(date(2023, 5, 15), 3)
+        with open(self.storage.data_file) as f:
+            data = json.load(f)
+        data["work_entries"][0]["hours"] = 8
+        with open(self.storage.data_file, 'w') as f:
+            json.dump(data, f)
+
+        storage = self.reopen_storage()
+        self.assertEqual(storage.get_total_hours(storage.get_work_entries(date(2023, 5, 1), date(2023, 5, 31))), 8)
+        self.assertEqual(storage.total_hours(date(2023, 5, 1), date(2023, 5, 31)), 8)
+        self.assertEqual(storage.get_daily_totals(date(2023, 5, 1), date(2023, 5, 31)), {"2023-05-15": 8})
+
+
+class TestColumnarJSONStorage(TestJSONStorage):
+    """Test the JSON file backend with the columnar in-memory layout"""
+
+    def open_storage(self):
+        """Open a new storage instance holding its entries in typed arrays"""
+        return self.storage_class(data_dir=self.data_dir, settings={'layout': 'columnar'})
+
+    def test_entries_are_stored_in_columns(self):
+        """Test hours and dates live in typed arrays and descriptions are stored once"""
+        for day in range(1, 11):
+            self.storage.log_work(date(2023, 5, day), day, "Development")
+        self.storage.log_work(date(2023, 5, 3), 0.5, "Review")
+
+        table = self.reopen_storage()._entries
+        self.assertIsInstance(table, ColumnarEntryTable)
+        self.assertEqual(table.hours.typecode, 'd')
+        self.assertEqual(table.ordinals.typecode, 'i')
+        self.assertEqual(table.descriptions, ["Development", "Review"])
+        self.assertEqual(table.hours_between("2023-05-01", "2023-05-04"), 7.5)
+
+        entries = self.storage.get_work_entries(date(2023, 5, 2), date(2023, 5, 3))
+        self.assertEqual([(entry["date"], entry["description"]) for entry in entries],
+                         [("2023-05-02", "Development"), ("2023-05-03", "Review")])
+        self.assertEqual(self.storage.get_total_hours(entries), 2.5)
+
+    def test_saves_release_replaced_descriptions(self):
+        """Test descriptions of replaced entries are dropped from the description table on save"""
+        for day in range(1, 4):
+            self.storage.log_work(date(2023, 5, day), 1, f"Draft {day}")
+        with self.storage.batch():
+            for day in range(1, 4):
+                self.storage.log_work(date(2023, 5, day), 2, "Final")
+            self.assertEqual(len(self.storage._entries.descriptions), 4)
+
+        self.assertEqual(self.storage._entries.descriptions, ["Final"])
+        self.assertEqual([entry["description"] for entry in self.storage.get_work_entries(date(2023, 5, 1), date(2023, 5, 3))],
+                         ["Final"] * 3)
+
+
+class TestJournaledStorage(StorageBackendTests, TestCase):
+    """Test the journaled JSON backend"""
+
+    storage_class = JournaledWorkHoursStorage
+
+    def test_log_work_appends_to_journal(self):
+        """Test mutations append to the journal and leave the snapshot alone"""
+        snapshot = self.storage.data_file.read_text()
+        self.storage.log_work(date(2023, 5, 15), 6)
+        self.storage.log_work(date(2023, 5, 16), 2)
+
+        self.assertEqual(self.storage.data_file.read_text(), snapshot)
+        self.assertEqual(len(self.storage.journal_file.read_text().splitlines()), 2)
+
+    def test_journal_compaction(self):
+        """Test the journal is folded into the snapshot past the size threshold"""
+        self.storage.journal_max_bytes = 400
+        for day in range(1, 11):
+            self.storage.log_work(date(2023, 5, day), day)
+
+        journal_file = self.storage.journal_file
+        self.assertLess(journal_file.stat().st_size if journal_file.exists() else 0, 400)
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual([entry["hours"] for entry in entries], list(range(1, 11)))
+
+    def test_torn_journal_record_is_discarded(self):
+        """Test an incomplete last record is dropped instead of corrupting the journal"""
+        self.storage.log_work(date(2023, 5, 15), 6)
+        with open(self.storage.journal_file, 'a') as f:
+            f.write('{"op": "log_work", "ent')
+
+        storage = self.reopen_storage()
+        storage.log_work(date(2023, 5, 16), 2)
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        self.assertEqual([entry["hours"] for entry in entries], [6, 2])
+
+
+class TestWorkEntry(TestCase):
+    """Test the compact in-memory work entries"""
+
+    def test_json_round_trip(self):
+        """Test entries read like the dicts of the data file and convert back to them"""
+        data = {"date": "2023-05-15", "hours": 6.5, "description": "Work", "timestamp": "2023-05-15T09:00:00"}
+        entry = WorkEntry.from_dict(data)
+
+        self.assertEqual(entry.ordinal, date(2023, 5, 15).toordinal())
+        self.assertEqual((entry["date"], entry["hours"], entry.get("description")), ("2023-05-15", 6.5, "Work"))
+        self.assertEqual(entry.to_dict(), data)
+        self.assertEqual(entry, data)
+        self.assertEqual(json.loads(json.dumps({"entries": [entry]}, default=json_default)), {"entries": [data]})
+        with self.assertRaises(KeyError):
+            entry["ordinal"]
+
+
+class TestJSONStorageBatch(TestCase):
+    """Test batch() defers saving for the JSON backend"""
+
+    def test_batch_saves_once(self):
+        """Test the data file is written once at the end of the block"""
+        with tempfile.TemporaryDirectory() as test_dir:
+            storage = WorkHoursStorage(data_dir=test_dir)
+            with mock.patch.object(storage, 'save_data', wraps=storage.save_data) as save_data:
+                with storage.batch():
+                    for day in range(1, 11):
+                        storage.log_work(date(2023, 5, day), day)
+                    with storage.batch():
+                        storage.log_work(date(2023, 5, 11), 1)
+                    self.assertEqual(save_data.call_count, 0)
+            self.assertEqual(save_data.call_count, 1)
+
+
+class TestJSONStorageWriteBehind(TestCase):
+    """Test dirty tracking and write-behind saving for the JSON backend"""
+
+    def setUp(self):
+        """Set up a temporary data directory"""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.test_dir.cleanup)
+
+    def open_storage(self, delay=None):
+        """Open a storage with the given write-behind delay"""
+        storage = WorkHoursStorage(data_dir=self.test_dir.name, settings={'write_behind_delay': delay})
+        self.addCleanup(storage.close)
+        return storage
+
+    def stored_hours(self):
+        """Get the hours in the data file"""
+        with open(Path(self.test_dir.name) / 'aldo_data.json') as f:
+            return [entry["hours"] for entry in json.load(f)["work_entries"]]
+
+    def test_unchanged_state_is_not_saved(self):
+        """Test flushing a clean storage or repeating a mutation doesn't write the data file"""
+        storage = self.open_storage()
+        config = type('Config', (), {'config': {'invoice': {'prefix': 'INV-'}}})()
+        with mock.patch.object(storage, 'save_data', wraps=storage.save_data) as save_data:
+            storage.flush()
+            storage.store_unconfirmed_invoice('391', date(2023, 5, 1), date(2023, 5, 31), config)
+            storage.store_unconfirmed_invoice('INV-391', date(2023, 5, 1), date(2023, 5, 31), config)
+            storage.close()
+        self.assertEqual(save_data.call_count, 1)
+
+    def test_write_behind_saves_on_close(self):
+        """Test mutations are coalesced into one save when the storage is closed"""
+        storage = self.open_storage(delay=3600)
+        with mock.patch.object(storage, 'save_data', wraps=storage.save_data) as save_data:
+            for day in range(1, 6):
+                storage.log_work(date(2023, 5, day), day)
+            self.assertEqual(save_data.call_count, 0)
+            self.assertEqual(self.stored_hours(), [])
+
+            storage.close()
+        self.assertEqual(save_data.call_count, 1)
+        self.assertEqual(self.stored_hours(), [1, 2, 3, 4, 5])
+
+    def test_write_behind_saves_on_timer(self):
+        """Test mutations are saved once the write-behind delay has passed"""
+        storage = self.open_storage(delay=0.01)
+        storage.log_work(date(2023, 5, 1), 4)
+        timer = storage._flush_timer
+        timer.join(5)
+        self.assertFalse(timer.is_alive())
+        self.assertEqual(self.stored_hours(), [4])
+
+    def test_write_behind_keeps_other_saves(self):
+        """Test unsaved changes are saved on top of another process's save"""
+        storage = self.open_storage(delay=3600)
+        storage.log_work(date(2023, 5, 1), 4)
+        other = self.open_storage()
+        other.log_work(date(2023, 5, 2), 6)
+        storage.close()
+        self.assertEqual(self.stored_hours(), [4, 6])
+        self.assertEqual(storage.total_hours(date(2023, 5, 1), date(2023, 5, 31)), 10)
+
+    def test_batch_lets_others_read(self):
+        """Test the data can be loaded while a batch is open, and the batch keeps later saves"""
+        storage = self.open_storage()
+        with storage.batch():
+            storage.log_work(date(2023, 5, 1), 4)
+            other = self.open_storage()
+            self.assertEqual(other.total_hours(date(2023, 5, 1), date(2023, 5, 31)), 0)
+        other.log_work(date(2023, 5, 2), 6)
+        storage.log_work(date(2023, 5, 3), 2)
+        self.assertEqual(self.stored_hours(), [4, 6, 2])
+
+
+class TestShardedStorage(StorageBackendTests, TestCase):
+    """Test the year-sharded backend"""
+
+    storage_class = ShardedWorkHoursStorage
+
+    def test_only_requested_shards_are_loaded(self):
+        """Test queries load only the shards of the years they cover"""
+        self.storage.log_work(date(2022, 3, 1), 4)
+        self.storage.log_work(date(2023, 5, 15), 6)
+        self.assertEqual(sorted(path.name for path in self.storage.shards_dir.iterdir()), ['2022.json', '2023.json'])
+
+        storage = self.reopen_storage()
+        entries = storage.get_work_entries(date(2023, 1, 1), date(2023, 12, 31))
+        self.assertEqual([entry["hours"] for entry in entries], [6])
+        self.assertEqual(list(storage._shards), ['2023'])
+
+        storage.log_work(date(2023, 5, 16), 2)
+        self.assertEqual(list(storage._shards), ['2023'])
+        self.assertEqual(len(self.reopen_storage().export_data()['work_entries']), 3)
+
+
+class TestColumnarShardedStorage(TestShardedStorage):
+    """Test the year-sharded backend with the columnar in-memory layout"""
+
+    def open_storage(self):
+        """Open a new storage instance holding its shards in typed arrays"""
+        return self.storage_class(data_dir=self.data_dir, settings={'layout': 'columnar'})
+
+
+class TestSQLiteStorage(StorageBackendTests, TestCase):
+    """Test the SQLite backend"""
+
+    storage_class = SQLiteWorkHoursStorage
+
+    def test_log_work_replaces_rows_committed_meanwhile(self):
+        """Test the rows a logged entry replaces are read in its write transaction"""
+        locked = threading.Event()
+
+        def other_writer():
+            other = sqlite3.connect(str(self.storage.data_file), isolation_level=None)
+            other.execute("BEGIN IMMEDIATE")
+            other.execute("INSERT INTO work_entries (date, hours, description, timestamp) "
+                          "VALUES ('2023-05-01', 2, '', '')")
+            locked.set()
+            # Commit while log_work() runs, after it would have read the date's rows
+            time.sleep(0.3)
+            other.execute("COMMIT")
+            other.close()
+
+        writer = threading.Thread(target=other_writer)
+        writer.start()
+        locked.wait(10)
+        self.storage.log_work(date(2023, 5, 1), 4)
+        writer.join(10)
+
+        entries = self.reopen_storage().get_work_entries(date(2023, 5, 1), date(2023, 5, 1))
+        self.assertEqual([entry["hours"] for entry in entries], [4])
+
+
+class TestBinaryStorage(StorageBackendTests, TestCase):
+    """Test the memory-mapped binary backend"""
+
+    storage_class = BinaryWorkHoursStorage
+
+    def test_entries_are_read_from_the_mapped_file(self):
+        """Test saved entries are decoded from fixed-width records, not held in memory"""
+        self.storage.log_many((date(2023, 5, day), day, f"Día {day}") for day in range(1, 11))
+        self.assertEqual(self.storage._pending, {})
+
+        storage = self.reopen_storage()
+        self.assertEqual(storage.data_file.stat().st_size, len(storage._stored) * 24 + 12 + len(b"".join(
+            entry.description.encode('utf-8') + entry.timestamp.encode('utf-8')
+            for entry in storage.get_work_entries(date(2023, 5, 1), date(2023, 5, 31))
+        )))
+        self.assertEqual(storage.get_entries_for_date("2023-05-07")[0]["description"], "Día 7")
+        self.assertEqual(storage.get_latest_entry_date(), date(2023, 5, 10))
+
+    def test_json_round_trip(self):
+        """Test data converts from the JSON backend and back without changes"""
+        source = WorkHoursStorage(data_dir=Path(self.test_dir.name) / 'source')
+        for day, hours in [(15, 6.5), (1, 2.0), (20, 8.0)]:
+            source.log_work(date(2023, 5, day), hours, f"Work {day}")
+
+        self.storage.replace_all(source.export_data())
+        target = WorkHoursStorage(data_dir=Path(self.test_dir.name) / 'target')
+        target.replace_all(self.reopen_storage().export_data())
+        self.assertEqual(target.export_data()['work_entries'], source.export_data()['work_entries'])
+
+
+class TestInvoiceArchive(TestCase):
+    """Test archiving the entries of confirmed invoices"""
+
+    config = type('Config', (), {'config': {'invoice': {'prefix': 'INV-'}}})()
+
+    def setUp(self):
+        """Set up a temporary data directory"""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.test_dir.cleanup)
+
+    def open_storage(self, storage_class=WorkHoursStorage, compression='gzip'):
+        """Open a storage archiving confirmed invoices"""
+        settings = {'archive_confirmed': True, 'archive_compression': compression}
+        return storage_class(data_dir=self.test_dir.name, settings=settings)
+
+    def log_and_confirm(self, storage):
+        """Log May and June 2023 and confirm an invoice for May"""
+        storage.log_many((date(2023, month, day), 1, f"Work {month}/{day}") for month in (5, 6) for day in range(1, 31))
+        storage.store_unconfirmed_invoice('391', date(2023, 5, 1), date(2023, 5, 31), self.config)
+        storage.confirm_invoice('391', self.config)
+
+    def test_confirmed_entries_move_to_archive(self):
+        """Test entries of a confirmed invoice leave the data file but stay queryable"""
+        for storage_class in (WorkHoursStorage, JournaledWorkHoursStorage):
+            for compression, suffix in (('gzip', '.json.gz'), ('lzma', '.json.xz')):
+                with self.subTest(storage_class=storage_class.__name__, compression=compression):
+                    self.setUp()
+                    storage = self.open_storage(storage_class, compression)
+                    self.log_and_confirm(storage)
+                    storage.close()
+                    if storage_class is JournaledWorkHoursStorage:
+                        storage.compact()
+
+                    with open(storage.data_file) as f:
+                        data = json.load(f)
+                    self.assertEqual({entry["date"][:7] for entry in data["work_entries"]}, {"2023-06"})
+                    self.assertTrue((storage.archive_dir / f'invoice-391{suffix}').exists())
+
+                    storage = self.open_storage(storage_class, compression)
+                    self.assertEqual(storage._archives, {})
+                    self.assertEqual(storage.total_hours(date(2023, 5, 1), date(2023, 6, 30)), 60)
+                    self.assertEqual(storage._archives, {})
+
+                    entries = storage.get_work_entries(date(2023, 5, 30), date(2023, 6, 2))
+                    self.assertEqual([entry["date"] for entry in entries],
+                                     ["2023-05-30", "2023-06-01", "2023-06-02"])
+                    self.assertEqual(storage.get_entries_for_date("2023-05-15")[0]["description"], "Work 5/15")
+                    self.assertEqual(storage.get_earliest_entry_date(), date(2023, 5, 1))
+                    self.assertEqual(len(storage.export_data()['work_entries']), 60)
+                    self.assertNotIn('archive', storage.export_data()['confirmed_invoices']['391'])
+                    storage.close()
+
+    def test_rollups_keep_archived_totals(self):
+        """Test rollups rebuilt after an edit of the data file keep the hours of archived entries"""
+        storage = self.open_storage()
+        self.log_and_confirm(storage)
+        with open(storage.data_file) as f:
+            data = json.load(f)
+        data["work_entries"][0]["hours"] = 5
+        with open(storage.data_file, 'w') as f:
+            json.dump(data, f)
+
+        storage = self.open_storage()
+        self.assertEqual(storage.total_hours(date(2023, 5, 1), date(2023, 6, 30)), 64)
+        self.assertEqual(storage.get_daily_totals(date(2023, 5, 30), date(2023, 6, 1)),
+                         {"2023-05-30": 1, "2023-06-01": 5})
+
+    def test_archived_dates_cannot_be_logged(self):
+        """Test billed dates are immutable once their entries are archived"""
+        storage = self.open_storage()
+        self.log_and_confirm(storage)
+        with self.assertRaisesRegex(ValueError, "confirmed invoice #391"):
+            storage.log_work(date(2023, 5, 15), 8)
+        storage.log_work(date(2023, 6, 15), 8)
+        self.assertEqual(storage.total_hours(date(2023, 5, 1), date(2023, 6, 30)), 67)
+
+    def test_journal_replays_over_archive(self):
+        """Test a journal left behind by a compaction interrupted after the snapshot write is replayed"""
+        storage = self.open_storage(JournaledWorkHoursStorage)
+        self.log_and_confirm(storage)
+        journal = storage.journal_file.read_bytes()
+        storage.compact()
+        # Crash before the journal was removed
+        storage.journal_file.write_bytes(journal)
+        storage.close()
+
+        storage = self.open_storage(JournaledWorkHoursStorage)
+        self.assertEqual(storage.total_hours(date(2023, 5, 1), date(2023, 6, 30)), 60)
+        self.assertEqual(storage.get_daily_totals(date(2023, 5, 3), date(2023, 5, 3)), {"2023-05-03": 1})
+        self.assertEqual(len(storage.get_work_entries(date(2023, 5, 1), date(2023, 6, 30))), 60)
@@ -0,0 +1,75 @@
+"""
+Tests for Aldo timesheet import and export
+"""
+
+import io
+from datetime import date
+from unittest import TestCase
+
+from aldo.timesheets import parse_hours, read_timesheet, write_timesheet
+
+
+class TestReadTimesheet(TestCase):
+    """Test streaming work entries from timesheet files"""
+
+    def test_read_csv(self):
+        """Test CSV rows are parsed with an optional description column"""
+        f = io.StringIO("date,hours,description\n2023-05-15,6,\"Design, review\"\n2023-05-16,2.5,\n")
+        self.assertEqual(list(read_timesheet(f, 'csv')), [
+            (date(2023, 5, 15), 6.0, "Design, review"),
+            (date(2023, 5, 16), 2.5, ""),
+        ])
+
+    def test_read_jsonl(self):
+        """Test JSONL rows are parsed and blank lines skipped"""
+        f = io.StringIO('{"date": "2023-05-15", "hours": 6}\n\n{"date": "2023-05-16", "hours": "2", "description": "Fix"}\n')
+        self.assertEqual(list(read_timesheet(f, 'jsonl')), [
+            (date(2023, 5, 15), 6.0, ""),
+            (date(2023, 5, 16), 2.0, "Fix"),
+        ])
+
+    def test_invalid_rows_name_their_line(self):
+        """Test rows are validated with the same rules as 'aldo log'"""
+        f = io.StringIO("date,hours\n2023-05-15,6\n2023-05-32,2\n")
+        with self.assertRaisesRegex(ValueError, "Line 3: Date must be in YYYY-MM-DD format"):
+            list(read_timesheet(f, 'csv'))
+
+        f = io.StringIO('{"date": "2023-05-15", "hours": 0}\n')
+        with self.assertRaisesRegex(ValueError, "Line 1: Hours must be a positive number"):
+            list(read_timesheet(f, 'jsonl'))
+
+        with self.assertRaises(ValueError):
+            parse_hours("nan")
+
+    def test_csv_needs_header(self):
+        """Test CSV files without date and hours columns are rejected"""
+        with self.assertRaisesRegex(ValueError, "header row"):
+            list(read_timesheet(io.StringIO("2023-05-15,6\n"), 'csv'))
+
+
+class TestWriteTimesheet(TestCase):
+    """Test streaming work entries to timesheet files"""
+
+    entries = [
+        {"date": "2023-05-15", "hours": 6, "description": "Design, review", "timestamp": "2023-05-15T09:00:00"},
+        {"date": "2023-05-16", "hours": 2.5, "description": "", "timestamp": "2023-05-16T09:00:00"},
+    ]
+
+    def test_round_trip(self):
+        """Test exported timesheets can be imported again in both formats"""
+        for file_format in ('csv', 'jsonl'):
+            f = io.StringIO()
+            self.assertEqual(write_timesheet(f, iter(self.entries), file_format), 2)
+            f.seek(0)
+            self.assertEqual(list(read_timesheet(f, file_format)), [
+                (date(2023, 5, 15), 6.0, "Design, review"),
+                (date(2023, 5, 16), 2.5, ""),
+            ])
+
+    def test_csv_columns(self):
+        """Test CSV exports have a header row and one line per entry"""
+        f = io.StringIO()
+        write_timesheet(f, self.entries, 'csv')
+        lines = f.getvalue().splitlines()
+        self.assertEqual(lines[0], "date,hours,description,timestamp")
+        self.assertEqual(lines[1], '2023-05-15,6,"Design, review",2023-05-15T09:00:00')